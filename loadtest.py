@@ -0,0 +1,329 @@
+"""Offline load test for the bot.
+
+Drives main.on_message with stand-ins for the parts of the py-cord API the bot uses,
+so command bursts can be measured without a Discord server:
+
+    python loadtest.py --images shots/ --rate 5 --count 200
+    python loadtest.py --images shots/ --script traffic.txt --rate 2
+
+Script files hold one command per line. A line may end with "< a.png,b.png" to attach
+fixture images (paths relative to --images), and "{scan}" is replaced with the most
+recent scan ID the bot replied with. Lines starting with # are ignored.
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from PIL import Image
+
+# main.py reads DATA_DIR at import time; keep load-test writes away from real data.
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="percentagebot-load-"))
+
+import main  # noqa: E402
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+
+# Randomised traffic: (weight, command template). Roughly what a war-night channel looks like.
+RANDOM_MIX = [
+    (25, "!scan bg{bg} < {image}"),
+    (10, "!confirm {scan}"),
+    (5, "!showscan {scan}"),
+    (20, "!list"),
+    (30, "!viewbg {bg}"),
+    (5, "!exportdata"),
+    (5, '!rename "{name}" "{name}"'),
+]
+
+_ids = itertools.count(1_000_000)
+
+
+@dataclass
+class FakeAuthor:
+    id: int
+    name: str = "loadtest"
+    bot: bool = False
+
+    def __str__(self) -> str:
+        return self.name
+
+
+@dataclass
+class FakeAttachment:
+    filename: str
+    data: bytes
+    content_type: str = "image/png"
+    id: int = field(default_factory=lambda: next(_ids))
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    def __post_init__(self):
+        try:
+            with Image.open(io.BytesIO(self.data)) as image:
+                self.width, self.height = image.size
+        except Exception:
+            pass
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    async def read(self) -> bytes:
+        return self.data
+
+
+@dataclass
+class FakeMessage:
+    content: str
+    author: FakeAuthor
+    channel: "FakeChannel"
+    attachments: list = field(default_factory=list)
+    reference: object = None
+    guild: object = None
+    id: int = field(default_factory=lambda: next(_ids))
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, bot_author: FakeAuthor):
+        self.id = channel_id
+        self.bot_author = bot_author
+        self.messages: list[FakeMessage] = []
+        self.sent_bytes = 0
+        self.errors = 0
+        self.last_scan_id: Optional[str] = None
+
+    async def send(self, content=None, file=None, **kwargs):
+        text = content or ""
+        self.sent_bytes += len(text)
+        if text.startswith("```txt\nError: "):
+            # on_message reports handler exceptions back to the channel.
+            self.errors += 1
+        match = re.search(r"Scan ID: ([0-9A-F]+)", text)
+        if match:
+            self.last_scan_id = match.group(1)
+        message = FakeMessage(content=text, author=self.bot_author, channel=self)
+        self.messages.append(message)
+        return message
+
+    def typing(self):
+        return FakeTyping()
+
+    async def history(self, limit: int = 100, before=None):
+        older = self.messages
+        if before is not None:
+            older = [m for m in older if m.id < before.id]
+        for message in list(reversed(older))[:limit]:
+            yield message
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def load_fixtures(folder: str) -> dict[str, bytes]:
+    fixtures = {}
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(IMAGE_SUFFIXES):
+            with open(os.path.join(folder, name), "rb") as file:
+                fixtures[name] = file.read()
+    return fixtures
+
+
+def scripted_commands(path: str) -> list[str]:
+    with open(path, "r", encoding="utf-8") as file:
+        lines = [line.strip() for line in file]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def random_commands(count: int, fixtures: dict[str, bytes], seed: int) -> list[str]:
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in RANDOM_MIX]
+    templates = [template for _, template in RANDOM_MIX]
+    names = ["Silent.Slayer", "bos rocker", "Whec", "Vazwya"]
+    commands = []
+    for _ in range(count):
+        template = rng.choices(templates, weights)[0]
+        if "{image}" in template and not fixtures:
+            template = "!list"
+        commands.append(template.format(
+            bg=rng.randint(1, 3),
+            image=rng.choice(list(fixtures)) if fixtures else "",
+            name=rng.choice(names),
+            scan="{scan}",
+        ))
+    return commands
+
+
+def build_message(command: str, channel: FakeChannel, author: FakeAuthor, fixtures: dict[str, bytes]) -> FakeMessage:
+    attachments = []
+    if " < " in command:
+        command, files = command.rsplit(" < ", 1)
+        for name in files.split(","):
+            name = name.strip()
+            if name in fixtures:
+                content_type = "image/jpeg" if name.lower().endswith((".jpg", ".jpeg")) else "image/png"
+                attachments.append(FakeAttachment(filename=name, data=fixtures[name], content_type=content_type))
+    command = command.replace("{scan}", channel.last_scan_id or "NONE")
+    message = FakeMessage(content=command, author=author, channel=channel, attachments=attachments)
+    channel.messages.append(message)
+    return message
+
+
+async def watch_loop_lag(samples: list[float], stop: asyncio.Event, interval: float = 0.05):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+async def run_load(commands: list[str], fixtures: dict[str, bytes], rate: float, channels: int, workers: int = 0) -> dict:
+    # on_ready never fires here, so start the OCR worker tier the way it would.
+    main.OCR_WORKERS = workers
+    supervisor = asyncio.create_task(main.ocr_worker.supervise(workers)) if workers > 0 else None
+    bot_author = FakeAuthor(id=1, name="percentagebot", bot=True)
+    authors = [FakeAuthor(id=100 + i, name=f"officer{i}") for i in range(channels)]
+    fake_channels = [FakeChannel(500 + i, bot_author) for i in range(channels)]
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors = 0
+    lag: list[float] = []
+    stop = asyncio.Event()
+
+    async def dispatch(command: str, slot: int):
+        nonlocal errors
+        channel = fake_channels[slot % channels]
+        message = build_message(command, channel, authors[slot % channels], fixtures)
+        name = command.lstrip(main.PREFIX).split(maxsplit=1)[0].lower() if command.strip() else "?"
+        started = time.perf_counter()
+        try:
+            await main.on_message(message)
+        except Exception:
+            errors += 1
+        latencies[name].append(time.perf_counter() - started)
+
+    watcher = asyncio.create_task(watch_loop_lag(lag, stop))
+    started = time.perf_counter()
+    tasks = []
+    for slot, command in enumerate(commands):
+        # Open loop: commands arrive on schedule whether or not earlier ones finished.
+        delay = started + slot / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(dispatch(command, slot)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+    if supervisor is not None:
+        supervisor.cancel()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "commands": len(commands),
+        "errors": errors + sum(channel.errors for channel in fake_channels),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(commands) / elapsed, 2) if elapsed else 0.0,
+        "latency_s": {
+            name: summarise(values)
+            for name, values in sorted(latencies.items()) + [("all", all_latencies)]
+        },
+        "loop_lag_s": {
+            "p50": round(percentile(lag, 50), 4),
+            "p99": round(percentile(lag, 99), 4),
+            "max": round(max(lag, default=0.0), 4),
+        },
+        "peak_rss_mb": {
+            # ru_maxrss is in KiB on Linux.
+            "bot": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "ocr_children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        },
+        "reply_bytes": sum(channel.sent_bytes for channel in fake_channels),
+    }
+
+
+def summarise(values: list[float]) -> dict:
+    return {
+        "n": len(values),
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values, default=0.0), 4),
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"Commands: {report['commands']}  errors: {report['errors']}  elapsed: {report['elapsed_s']}s",
+        f"Throughput: {report['throughput_per_s']} commands/s",
+        "",
+        f"{'command':<12}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}",
+    ]
+    for name, stats in report["latency_s"].items():
+        lines.append(
+            f"{name:<12}{stats['n']:>6}{stats['p50']:>10.4f}{stats['p95']:>10.4f}{stats['p99']:>10.4f}{stats['max']:>10.4f}"
+        )
+    lag = report["loop_lag_s"]
+    rss = report["peak_rss_mb"]
+    lines.extend([
+        "",
+        f"Event loop lag: p50={lag['p50']}s p99={lag['p99']}s max={lag['max']}s",
+        f"Peak RSS: bot={rss['bot']} MB, largest OCR child={rss['ocr_children']} MB",
+    ])
+    return "\n".join(lines)
+
+
+def main_cli(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay command traffic against the bot without Discord.")
+    parser.add_argument("--images", default=".", help="folder of screenshot fixtures")
+    parser.add_argument("--script", help="command script; random traffic when omitted")
+    parser.add_argument("--count", type=int, default=100, help="random commands to send")
+    parser.add_argument("--rate", type=float, default=2.0, help="commands per second")
+    parser.add_argument("--channels", type=int, default=3, help="fake channels to spread traffic over")
+    parser.add_argument("--workers", type=int, default=0, help="OCR worker processes; 0 runs OCR in-process")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures(args.images)
+    if args.script:
+        commands = scripted_commands(args.script)
+    else:
+        commands = random_commands(args.count, fixtures, args.seed)
+    if not commands:
+        print("No commands to send.", file=sys.stderr)
+        return 1
+
+    report = asyncio.run(run_load(commands, fixtures, max(0.01, args.rate), max(1, args.channels), max(0, args.workers)))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0 if report["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,7 +1,9 @@
 import asyncio
+import functools
 import io
 import json
 import os
+import re
 import secrets
 import shlex
 import traceback
@@ -10,33 +12,70 @@ from typing import Optional
 
 import discord
 
-from ocr_parser import parse_battlegroup_image
+import ocr_worker
+import read_model
+from memory import MemoryGovernor, estimate_scan_mb
+from ocr_parser import (
+    MAX_DECODE_PIXELS,
+    alias_pairs,
+    layout_key,
+    parse_battlegroup_images,
+    set_aliases,
+    set_header_templates,
+    set_roster,
+)
 from storage import (
-    clear_bg,
+    add_change_listener,
+    count_layout_use,
+    load_aliases,
     load_config,
     load_data,
-    remove_player,
-    rename_player,
+    load_header_templates,
+    load_layouts,
+    record_aliases,
+    record_header_template,
+    record_layout,
+    reset_layout,
     save_config,
     save_data,
     save_reservations,
+    transaction,
     wipe_all,
 )
 
 TOKEN = os.getenv("DISCORD_TOKEN")
 PREFIX = os.getenv("BOT_PREFIX", "!")
 MAX_MESSAGE = 1850
+# Total seconds one scan may spend on OCR before it returns what it has.
+SCAN_BUDGET = float(os.getenv("SCAN_BUDGET", "30"))
+# OCR worker processes; 0 runs OCR in a thread inside the bot process instead.
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "1"))
+# Attachments outside these bounds are skipped without downloading them.
+MAX_ATTACHMENT_BYTES = int(float(os.getenv("MAX_ATTACHMENT_MB", "12")) * 1024 * 1024)
+MIN_ATTACHMENT_WIDTH = 400
+# How far back to look for a screenshot posted just before the scan command.
+IMAGE_LOOKBACK = 10
+# 1 keeps a separate set of device layout profiles for each Discord server.
+LAYOUTS_PER_GUILD = os.getenv("LAYOUTS_PER_GUILD", "0") == "1"
 
 intents = discord.Intents.default()
 intents.message_content = True
 bot = discord.Client(intents=intents)
 scan_lock = asyncio.Lock()
 pending_scans = {}
+# Last scan confirmed without edits for each battlegroup. Rescans reuse its unchanged rows.
+accepted_scans = {}
+worker_supervisor = None
+memory_governor = MemoryGovernor()
+memory_governor.worker_pids = ocr_worker.worker_pids
 
 
 @bot.event
 async def on_ready():
+    global worker_supervisor
     print(f"Logged in as {bot.user}")
+    if OCR_WORKERS > 0 and worker_supervisor is None:
+        worker_supervisor = asyncio.create_task(ocr_worker.supervise(OCR_WORKERS))
 
 
 @bot.event
@@ -76,6 +115,8 @@ async def on_message(message: discord.Message):
             await cmd_clear_player(message, args_text)
         elif command == "rename":
             await cmd_rename(message, args_text)
+        elif command == "move":
+            await cmd_move(message, args_text)
         elif command == "wipe":
             await cmd_wipe(message, args_text)
         elif command == "exportdata":
@@ -88,6 +129,12 @@ async def on_message(message: discord.Message):
             await cmd_set_channel(message, args_text, "scan_channel_id", "scan channel")
         elif command == "config":
             await cmd_config(message)
+        elif command == "status":
+            await cmd_status(message)
+        elif command == "layouts":
+            await cmd_layouts(message)
+        elif command == "resetlayout":
+            await cmd_resetlayout(message, args_text)
         elif command in {"help", "commands"}:
             await cmd_help(message)
     except Exception as error:
@@ -127,26 +174,134 @@ async def cmd_scan(message: discord.Message, args_text: str):
         return
 
     bg_override, debug = parse_bg_arg(args_text)
-    image_bytes = await find_image_for_scan(message)
-    if image_bytes is None:
+    stitch = "stitch" in args_text.lower().split()
+    if not stitch:
+        attachments = scan_attachments(message)
+        if "all" in args_text.lower().split() or len(attachments) > 1:
+            if bg_override is not None:
+                # Each screenshot of a combined scan takes its BG from its own header.
+                await message.reply(
+                    f"A BG cannot be set for several screenshots at once. Use `!scan bg{bg_override} stitch` "
+                    "if they are one BG's list, or `!scan all` to read each BG from its header."
+                )
+                return
+            await scan_all(message, attachments, debug)
+            return
+    if stitch:
+        images = await find_images_for_scan(message)
+    else:
+        image_bytes = await find_image_for_scan(message)
+        images = [image_bytes] if image_bytes is not None else []
+    if not images:
         await message.reply("No image found. Attach a screenshot, reply to one, or send the scan command right after the screenshot.")
         return
 
     async with message.channel.typing():
-        async with scan_lock:
-            result = await asyncio.to_thread(parse_battlegroup_image, image_bytes, bg_override)
+        result = await run_scan(images, bg_override, message_layouts(message), channel_bg_hint(message))
+    if result.layout_profile:
+        count_layout_use(profile_key(message, result.layout_profile), "hits")
 
     scan_id = secrets.token_hex(3).upper()
     pending_scans[scan_id] = {
         "battlegroup": result.battlegroup,
         "reserved_names": result.reserved_names,
         "author_id": message.author.id,
+        "result": result,
+        "edited": False,
     }
 
     output = format_scan_result(scan_id, result, debug)
     await send_code(message.channel, output)
 
 
+async def scan_all(message: discord.Message, attachments: list, debug: bool):
+    # One screenshot per battlegroup. The next download runs while the current image is
+    # in OCR, and each image's battlegroup comes from its own header.
+    if not attachments:
+        await message.reply("No images found. Attach one screenshot per BG to the !scan all message.")
+        return
+
+    layouts = message_layouts(message)
+    parts = []
+    failure: Optional[Exception] = None
+    async with message.channel.typing():
+        next_read = asyncio.create_task(attachments[0].read())
+        try:
+            for index in range(len(attachments)):
+                read = next_read
+                if index + 1 < len(attachments):
+                    next_read = asyncio.create_task(attachments[index + 1].read())
+                try:
+                    result = await run_scan([await read], None, layouts)
+                except Exception as error:
+                    # One bad screenshot should not cost the battlegroups that did read.
+                    failure = error
+                    parts.append({
+                        "battlegroup": None,
+                        "reserved_names": [],
+                        "result": None,
+                        "edited": False,
+                        "error": f"{type(error).__name__}: {error}",
+                    })
+                    continue
+                if result.layout_profile:
+                    count_layout_use(profile_key(message, result.layout_profile), "hits")
+                parts.append({
+                    "battlegroup": result.battlegroup,
+                    "reserved_names": result.reserved_names,
+                    "result": result,
+                    "edited": False,
+                })
+        finally:
+            if not next_read.done():
+                next_read.cancel()
+            await asyncio.gather(next_read, return_exceptions=True)
+
+    if failure is not None and all(part.get("error") for part in parts):
+        raise failure
+    scan_id = secrets.token_hex(3).upper()
+    pending_scans[scan_id] = {"parts": parts, "author_id": message.author.id}
+    await send_code(message.channel, format_combined_scan(scan_id, parts, debug))
+
+
+async def run_scan(images: list[bytes], bg_override: Optional[int], layouts: dict, bg_hint: Optional[int] = None):
+    previous = dict(accepted_scans)
+    estimate = functools.partial(estimate_scan_mb, images)
+    async with memory_governor.admit(estimate) as (ocr_slots, low_memory):
+        if OCR_WORKERS > 0:
+            return await ocr_worker.run_scan_job(
+                images, bg_override, previous, SCAN_BUDGET, layouts, bg_hint, low_memory, ocr_slots
+            )
+        async with scan_lock:
+            return await asyncio.to_thread(
+                parse_battlegroup_images, images, bg_override, previous, SCAN_BUDGET,
+                layouts=layouts, battlegroup_hint=bg_hint, low_memory=low_memory, ocr_slots=ocr_slots,
+            )
+
+
+def channel_bg_hint(message: discord.Message) -> Optional[int]:
+    # Channels named like "bg2-defense" hint the battlegroup when the header is unclear.
+    name = getattr(message.channel, "name", None) or ""
+    match = re.search(r"(?<![a-z])bg[-_ ]?([123])(?!\d)", name.lower())
+    return int(match.group(1)) if match else None
+
+
+def profile_key(message: discord.Message, size_key: str) -> str:
+    if LAYOUTS_PER_GUILD and message.guild is not None:
+        return f"{message.guild.id}:{size_key}"
+    return size_key
+
+
+def message_layouts(message: discord.Message) -> dict:
+    # Layout profiles for this message's server, keyed by plain "WxH" for the parser.
+    layouts = {}
+    for key, profile in load_layouts().items():
+        guild, _, size_key = key.rpartition(":")
+        if profile_key(message, size_key) == key and profile.get("panel") and profile.get("rows"):
+            layouts[size_key] = profile
+    return layouts
+
+
 async def find_image_for_scan(message: discord.Message) -> Optional[bytes]:
     image = await first_image_bytes(message.attachments)
     if image is not None:
@@ -159,26 +314,98 @@ async def find_image_for_scan(message: discord.Message) -> Optional[bytes]:
             if image is not None:
                 return image
 
-    async for old in message.channel.history(limit=10, before=message):
+    # Messages the bot has already seen are in its cache; only go to the API when
+    # the cache does not hold the whole lookback window for this channel.
+    cached = recent_cached_messages(message)
+    for old in cached:
         if old.author.bot:
             continue
         image = await first_image_bytes(old.attachments)
         if image is not None:
             return image
+    if len(cached) >= IMAGE_LOOKBACK:
+        return None
+
+    checked = {old.id for old in cached}
+    async for old in message.channel.history(limit=IMAGE_LOOKBACK, before=message):
+        if old.author.bot or old.id in checked:
+            continue
+        image = await first_image_bytes(old.attachments)
+        if image is not None:
+            return image
 
     return None
 
 
-async def first_image_bytes(attachments) -> Optional[bytes]:
+def recent_cached_messages(message: discord.Message) -> list:
+    found = []
+    for old in reversed(bot.cached_messages):
+        if old.channel.id == message.channel.id and old.id < message.id:
+            found.append(old)
+            if len(found) >= IMAGE_LOOKBACK:
+                break
+    return found
+
+
+def scan_attachments(message: discord.Message) -> list:
+    found = image_attachments(message.attachments)
+    if not found and message.reference and isinstance(message.reference.resolved, discord.Message):
+        found = image_attachments(message.reference.resolved.attachments)
+    return found
+
+
+async def find_images_for_scan(message: discord.Message) -> list[bytes]:
+    # Stitch scans take every screenshot on the message, in upload order.
+    images = await all_image_bytes(message.attachments)
+    if images:
+        return images
+
+    if message.reference and message.reference.resolved:
+        resolved = message.reference.resolved
+        if isinstance(resolved, discord.Message):
+            images = await all_image_bytes(resolved.attachments)
+            if images:
+                return images
+
+    image = await find_image_for_scan(message)
+    return [image] if image is not None else []
+
+
+def image_attachments(attachments) -> list:
+    found = []
     for attachment in attachments:
         name = (attachment.filename or "").lower()
         content_type = attachment.content_type or ""
         is_image = content_type.startswith("image/") or name.endswith((".png", ".jpg", ".jpeg", ".webp"))
-        if is_image:
-            return await attachment.read()
+        if is_image and attachment_fits(attachment):
+            found.append(attachment)
+    return found
+
+
+def attachment_fits(attachment) -> bool:
+    # Discord reports size and dimensions up front, so oversized uploads and
+    # thumbnails are rejected before anything is downloaded.
+    if (attachment.size or 0) > MAX_ATTACHMENT_BYTES:
+        return False
+    width = getattr(attachment, "width", None) or 0
+    height = getattr(attachment, "height", None) or 0
+    if width and height:
+        if width * height > MAX_DECODE_PIXELS or width < MIN_ATTACHMENT_WIDTH:
+            return False
+    return True
+
+
+async def first_image_bytes(attachments) -> Optional[bytes]:
+    found = image_attachments(attachments)
+    if found:
+        return await found[0].read()
     return None
 
 
+async def all_image_bytes(attachments) -> list[bytes]:
+    return [await attachment.read() for attachment in image_attachments(attachments)]
+
+
 def format_scan_result(scan_id: str, result, debug: bool) -> str:
     bg = result.battlegroup if result.battlegroup is not None else "not detected"
     lines = [
@@ -188,27 +415,28 @@ def format_scan_result(scan_id: str, result, debug: bool) -> str:
         "Reserved detected:",
     ]
 
+    if result.image_count > 1:
+        lines.insert(2, f"Screenshots: {result.image_count} ({len(result.rows)} unique rows)")
+
+    reused = sum(row.source == "reused" for row in result.rows)
+    if reused:
+        lines.insert(2, f"Unchanged rows reused from last confirmed scan: {reused}/{len(result.rows)}")
+
     if result.reserved_names:
         lines.extend(f"- {name}" for name in result.reserved_names)
     else:
         lines.append("- None detected")
 
-    if debug:
+    unfinished = [str(row.row) for row in result.rows if not row.complete]
+    if unfinished:
         lines.extend([
             "",
-            f"Panel box: {result.panel_box}",
-            f"Header OCR: {result.header_text or '(manual or empty)'}",
-            "",
-            "Row debug:",
+            f"Time ran out before these rows were fully read: {', '.join(unfinished)}",
+            f"Check them and fix with {PREFIX}editscan {scan_id} if needed.",
         ])
-        for row in result.rows:
-            detected = row.name if row.name else "none"
-            lines.append(f"Row {row.row}: reserved={row.reserved} name={detected}")
-            if row.cleaned_lines:
-                for item in row.cleaned_lines:
-                    lines.append(f"  - {item}")
-            else:
-                lines.append("  - no text")
+
+    if debug:
+        lines.extend(format_debug_lines(result))
 
     lines.extend([
         "",
@@ -219,6 +447,73 @@ def format_scan_result(scan_id: str, result, debug: bool) -> str:
     return "\n".join(lines)
 
 
+def format_debug_lines(result) -> list[str]:
+    images = max((row.image for row in result.rows), default=1)
+    lines = [
+        "",
+        f"Panel box: {result.panel_box} ({result.panel_method or 'unknown'})",
+        f"Header OCR: {result.header_text or '(manual or empty)'}",
+    ]
+    lines.extend(result.notes)
+    lines.extend(["", "Row debug:"])
+    for row in result.rows:
+        detected = row.name if row.name else "none"
+        source = f" image={row.image}" if images > 1 else ""
+        partial = " (incomplete)" if not row.complete else ""
+        lines.append(f"Row {row.row}: reserved={row.reserved} name={detected}{source} [{row.source}]{partial}")
+        if row.cleaned_lines:
+            for item in row.cleaned_lines:
+                lines.append(f"  - {item}")
+        else:
+            lines.append("  - no text")
+    return lines
+
+
+def format_combined_scan(scan_id: str, parts: list[dict], debug: bool) -> str:
+    lines = [f"Scan ID: {scan_id}", f"Screenshots: {len(parts)}"]
+    for index, part in enumerate(parts, start=1):
+        bg = f"BG{part['battlegroup']}" if part.get("battlegroup") is not None else "BG not detected"
+        names = part.get("reserved_names") or []
+        lines.extend(["", f"Image {index}: {bg}"])
+        if part.get("error") and not part.get("edited"):
+            lines.append(f"- Could not be read ({part['error']}); it is skipped unless you edit it in.")
+        elif names:
+            lines.extend(f"- {name}" for name in names)
+        else:
+            lines.append("- None detected")
+        result = part.get("result")
+        if result is not None and not all(row.complete for row in result.rows):
+            lines.append("  Time ran out before every row was read; check this image.")
+        if debug and result is not None:
+            lines.extend(format_debug_lines(result))
+
+    problem = combined_scan_problem(parts)
+    if problem:
+        lines.extend(["", problem, f"Fix with: {PREFIX}editscan {scan_id} image2 bg3"])
+    lines.extend([
+        "",
+        f"Save all: {PREFIX}confirm {scan_id}",
+        f"Save and replace those BGs: {PREFIX}confirm {scan_id} replace",
+        f"Reject: {PREFIX}reject {scan_id}",
+    ])
+    return "\n".join(lines)
+
+
+def combined_scan_problem(parts: list[dict]) -> Optional[str]:
+    # Images that failed to read are left out until an edit gives them a BG and names.
+    missing = [
+        str(index) for index, part in enumerate(parts, start=1)
+        if part.get("battlegroup") is None and not (part.get("error") and not part.get("edited"))
+    ]
+    if missing:
+        return f"Battlegroup not detected for image {', '.join(missing)}."
+    seen = [part["battlegroup"] for part in parts if part.get("battlegroup") is not None]
+    repeated = sorted({bg for bg in seen if seen.count(bg) > 1})
+    if repeated:
+        return f"More than one image was read as BG{', BG'.join(str(bg) for bg in repeated)}."
+    return None
+
+
 async def cmd_confirm(message: discord.Message, args_text: str):
     parts = args_text.split()
     if not parts:
@@ -236,6 +531,9 @@ async def cmd_confirm(message: discord.Message, args_text: str):
     if not scan:
         await message.reply("That scan ID is not pending.")
         return
+    if "parts" in scan:
+        await confirm_combined(message, scan_id, scan, replace)
+        return
 
     bg = bg_override if bg_override is not None else scan.get("battlegroup")
     names = scan.get("reserved_names") or []
@@ -248,12 +546,61 @@ async def cmd_confirm(message: discord.Message, args_text: str):
 
     save_reservations(int(bg), names, replace=replace)
     pending_scans.pop(scan_id, None)
+    learn_from_confirm(message, int(bg), scan)
 
     mode = "replaced" if replace else "saved"
     await send_code(message.channel, f"BG{bg} {mode}:\n" + "\n".join(f"- {n}" for n in names))
     await log_action(message, f"Confirmed scan {scan_id} for BG{bg} with {len(names)} reserved players.")
 
 
+async def confirm_combined(message: discord.Message, scan_id: str, scan: dict, replace: bool):
+    problem = combined_scan_problem(scan["parts"])
+    if problem:
+        await message.reply(f"{problem} Fix it with {PREFIX}editscan {scan_id} image2 bg3 first.")
+        return
+    parts = [part for part in scan["parts"] if part.get("reserved_names")]
+    if not parts:
+        await message.reply("No reserved names were detected, so nothing was saved.")
+        return
+
+    # Every battlegroup is written in one storage commit.
+    with transaction() as tx:
+        for part in parts:
+            tx.save_reservations(int(part["battlegroup"]), part["reserved_names"], replace=replace)
+    pending_scans.pop(scan_id, None)
+    for part in parts:
+        learn_from_confirm(message, int(part["battlegroup"]), part)
+
+    mode = "replaced" if replace else "saved"
+    lines = []
+    for part in sorted(parts, key=lambda part: part["battlegroup"]):
+        lines.append(f"BG{part['battlegroup']} {mode}:")
+        lines.extend(f"- {name}" for name in part["reserved_names"])
+    await send_code(message.channel, "\n".join(lines))
+    total = sum(len(part["reserved_names"]) for part in parts)
+    bgs = ", ".join(f"BG{part['battlegroup']}" for part in parts)
+    await log_action(message, f"Confirmed scan {scan_id} for {bgs} with {total} reserved players.")
+
+
+def learn_from_confirm(message: discord.Message, bg: int, scan: dict) -> None:
+    result = scan.get("result")
+    if result is None:
+        return
+    if not scan.get("edited"):
+        accepted_scans[bg] = result
+        if result.image_size != (0, 0) and result.row_layout:
+            record_layout(profile_key(message, layout_key(result.image_size)), result.panel_box, result.row_layout)
+        if result.header_glyph and result.battlegroup == bg:
+            set_header_templates(record_header_template(bg, result.header_glyph))
+        return
+    if result.layout_profile:
+        count_layout_use(profile_key(message, result.layout_profile), "edited")
+    # Remember what OCR read for each corrected name so the next scan gets it right.
+    pairs = alias_pairs(result.reserved_names, scan.get("reserved_names") or [])
+    if pairs:
+        set_aliases(record_aliases(pairs))
+
+
 async def cmd_reject(message: discord.Message, args_text: str):
     scan_id = args_text.strip().upper()
     if not scan_id:
@@ -283,20 +630,42 @@ async def cmd_editscan(message: discord.Message, args_text: str):
         return
 
     bg = None
+    image = None
     names = []
     for part in parts[1:]:
         maybe_bg = parse_single_bg(part)
+        maybe_image = re.fullmatch(r"image(\d+)", part.strip().lower())
         if maybe_bg is not None:
             bg = maybe_bg
+        elif maybe_image and "parts" in scan:
+            image = int(maybe_image.group(1))
         else:
             cleaned = part.strip().strip('"')
             if cleaned:
                 names.append(cleaned)
 
+    if "parts" in scan:
+        # Combined scans: pick the image by number, or by the BG it was read as.
+        if image is not None and 1 <= image <= len(scan["parts"]):
+            target = scan["parts"][image - 1]
+        else:
+            target = next((part for part in scan["parts"] if bg is not None and part.get("battlegroup") == bg), None)
+        if target is None:
+            await message.reply(f'Use: !editscan {scan_id} image2 bg3 "Name One" "Name Two"')
+            return
+        if bg is not None:
+            target["battlegroup"] = bg
+        if names:
+            target["reserved_names"] = unique_keep_order_local(names)
+            target["edited"] = True
+        await send_code(message.channel, format_pending_scan(scan_id, scan))
+        return
+
     if bg is not None:
         scan["battlegroup"] = bg
     if names:
         scan["reserved_names"] = unique_keep_order_local(names)
+        scan["edited"] = True
 
     pending_scans[scan_id] = scan
     await send_code(message.channel, format_pending_scan(scan_id, scan))
@@ -315,6 +684,18 @@ async def cmd_showscan(message: discord.Message, args_text: str):
 
 
 def format_pending_scan(scan_id: str, scan: dict) -> str:
+    if "parts" in scan:
+        lines = [f"Pending scan: {scan_id}"]
+        for index, part in enumerate(scan["parts"], start=1):
+            bg = part.get("battlegroup") if part.get("battlegroup") is not None else "not set"
+            names = part.get("reserved_names") or []
+            lines.extend(["", f"Image {index}: battlegroup {bg}"])
+            if names:
+                lines.extend(f"- {name}" for name in names)
+            else:
+                lines.append("- none")
+        lines.extend(["", f"Confirm all: {PREFIX}confirm {scan_id}", f"Edit: {PREFIX}editscan {scan_id} image2 bg3 \"Name One\""])
+        return "\n".join(lines)
     bg = scan.get("battlegroup") if scan.get("battlegroup") is not None else "not set"
     names = scan.get("reserved_names") or []
     lines = [f"Pending scan: {scan_id}", f"Battlegroup: {bg}", "", "Reserved names:"]
@@ -342,20 +723,7 @@ def unique_keep_order_local(values: list[str]) -> list[str]:
 
 
 async def cmd_list(message: discord.Message):
-    data = load_data()
-    groups = data.get("battlegroups", {})
-    if not groups:
-        await send_code(message.channel, "No reservations saved yet.")
-        return
-
-    lines = []
-    for bg_key in sorted(groups, key=lambda x: int(x) if str(x).isdigit() else 999):
-        names = groups.get(bg_key, [])
-        lines.append(f"BG{bg_key}: {len(names)} reserved")
-        for name in names:
-            lines.append(f"- {name}")
-        lines.append("")
-    await send_code(message.channel, "\n".join(lines).strip())
+    await send_code(message.channel, read_model.list_text())
 
 
 async def cmd_viewbg(message: discord.Message, args_text: str):
@@ -363,12 +731,7 @@ async def cmd_viewbg(message: discord.Message, args_text: str):
     if bg is None:
         await message.reply("Use: !viewbg 2")
         return
-
-    names = load_data().get("battlegroups", {}).get(str(bg), [])
-    if not names:
-        await send_code(message.channel, f"BG{bg}: no reserved players saved.")
-        return
-    await send_code(message.channel, f"BG{bg}:\n" + "\n".join(f"- {n}" for n in names))
+    await send_code(message.channel, read_model.viewbg_text(bg))
 
 
 def parse_single_bg(text: str) -> Optional[int]:
@@ -383,24 +746,46 @@ def parse_single_bg(text: str) -> Optional[int]:
 
 
 async def cmd_clearbg(message: discord.Message, args_text: str):
-    bg = parse_single_bg(args_text)
-    if bg is None:
+    bgs = [bg for bg in (parse_single_bg(part) for part in args_text.split()) if bg is not None]
+    if not bgs:
         await message.reply("Use: !clearbg 2")
         return
-    clear_bg(bg)
-    await message.reply(f"Cleared BG{bg}.")
-    await log_action(message, f"Cleared BG{bg}.")
+    with transaction() as txn:
+        for bg in bgs:
+            txn.clear_bg(bg)
+    cleared = ", ".join(f"BG{bg}" for bg in bgs)
+    await message.reply(f"Cleared {cleared}.")
+    await log_action(message, f"Cleared {cleared}.")
+
+
+def split_names(args_text: str) -> list[str]:
+    # Quoted names can be listed several at a time; an unquoted argument is one name.
+    if '"' not in args_text:
+        name = args_text.strip()
+        return [name] if name else []
+    try:
+        return [part.strip() for part in shlex.split(args_text) if part.strip()]
+    except ValueError:
+        return []
 
 
 async def cmd_clear_player(message: discord.Message, args_text: str):
-    name = args_text.strip().strip('"')
-    if not name:
-        await message.reply('Use: !clear "Player Name"')
+    names = split_names(args_text)
+    if not names:
+        await message.reply('Use: !clear "Player Name" "Another Player"')
         return
-    changed = remove_player(name)
-    await message.reply("Removed player." if changed else "Player was not found.")
-    if changed:
-        await log_action(message, f"Removed player: {name}")
+    with transaction() as txn:
+        removed = [name for name in names if txn.remove_player(name)]
+    missing = [name for name in names if name not in removed]
+
+    lines = []
+    if removed:
+        lines.append("Removed: " + ", ".join(removed))
+    if missing:
+        lines.append("Not found: " + ", ".join(missing))
+    await message.reply("\n".join(lines))
+    if removed:
+        await log_action(message, "Removed players: " + ", ".join(removed))
 
 
 async def cmd_rename(message: discord.Message, args_text: str):
@@ -408,14 +793,52 @@ async def cmd_rename(message: discord.Message, args_text: str):
         parts = shlex.split(args_text)
     except ValueError:
         parts = []
-    if len(parts) < 2:
-        await message.reply('Use: !rename "Old Name" "New Name"')
+    if len(parts) < 2 or len(parts) % 2:
+        await message.reply('Use: !rename "Old Name" "New Name" ["Old Two" "New Two" ...]')
+        return
+    pairs = list(zip(parts[0::2], parts[1::2]))
+    with transaction() as txn:
+        renamed = [(old, new) for old, new in pairs if txn.rename_player(old, new)]
+    missing = [old for old, new in pairs if (old, new) not in renamed]
+
+    lines = []
+    if renamed:
+        lines.append("Renamed: " + ", ".join(f"{old} to {new}" for old, new in renamed))
+    if missing:
+        lines.append("Old name not found: " + ", ".join(missing))
+    await message.reply("\n".join(lines))
+    if renamed:
+        await log_action(message, "Renamed players: " + ", ".join(f"{old} to {new}" for old, new in renamed))
+
+
+async def cmd_move(message: discord.Message, args_text: str):
+    try:
+        parts = shlex.split(args_text)
+    except ValueError:
+        parts = []
+    bg = None
+    names = []
+    for part in parts:
+        maybe_bg = parse_single_bg(part)
+        if maybe_bg is not None:
+            bg = maybe_bg
+        elif part.strip():
+            names.append(part.strip())
+    if bg is None or not names:
+        await message.reply('Use: !move bg2 "Player Name" "Another Player"')
         return
-    old, new = parts[0], parts[1]
-    changed = rename_player(old, new)
-    await message.reply("Renamed player." if changed else "Old name was not found.")
-    if changed:
-        await log_action(message, f"Renamed player: {old} to {new}")
+    with transaction() as txn:
+        moved = [name for name in names if txn.move_player(name, bg)]
+    missing = [name for name in names if name not in moved]
+
+    lines = []
+    if moved:
+        lines.append(f"Moved to BG{bg}: " + ", ".join(moved))
+    if missing:
+        lines.append("Not found: " + ", ".join(missing))
+    await message.reply("\n".join(lines))
+    if moved:
+        await log_action(message, f"Moved players to BG{bg}: " + ", ".join(moved))
 
 
 async def cmd_wipe(message: discord.Message, args_text: str):
@@ -428,9 +851,7 @@ async def cmd_wipe(message: discord.Message, args_text: str):
 
 
 async def cmd_exportdata(message: discord.Message):
-    data = load_data()
-    payload = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
-    file = discord.File(io.BytesIO(payload), filename="reservations_backup.json")
+    file = discord.File(io.BytesIO(read_model.export_bytes()), filename="reservations_backup.json")
     await message.channel.send("Exported reservation data.", file=file)
 
 
@@ -496,6 +917,49 @@ async def cmd_config(message: discord.Message):
     await send_code(message.channel, "\n".join(lines))
 
 
+async def cmd_status(message: discord.Message):
+    memory = memory_governor.diagnostics()
+    lines = [
+        "Bot status:",
+        f"Memory: bot {memory['bot_rss_mb']} MB + OCR workers {memory['worker_rss_mb']} MB, budget {memory['budget_mb']} MB",
+        f"Scans running: {memory['running_scans']} (reserved {memory['reserved_mb']} MB over an idle {memory['baseline_mb']} MB), waiting: {memory['waiting_scans']}",
+        f"Scans run in low-memory mode: {memory['low_memory_scans']}",
+        f"OCR workers: {len(ocr_worker.worker_pids) if OCR_WORKERS > 0 else 'off (in-process)'}",
+        f"Pending scans: {len(pending_scans)}",
+    ]
+    await send_code(message.channel, "\n".join(lines))
+
+
+async def cmd_layouts(message: discord.Message):
+    profiles = load_layouts()
+    if not profiles:
+        await send_code(message.channel, "No layout profiles saved yet. They are learned from scans confirmed without edits.")
+        return
+    lines = ["Layout profiles (resolution: used / confirmed clean / confirmed after edits):"]
+    for key in sorted(profiles):
+        profile = profiles[key]
+        rows = len(profile.get("rows") or [])
+        lines.append(
+            f"{key}: {profile.get('hits', 0)} / {profile.get('confirmed', 0)} / {profile.get('edited', 0)}, {rows} rows"
+        )
+    lines.extend(["", f"Reset one: {PREFIX}resetlayout 1170x2532", f"Reset all: {PREFIX}resetlayout all"])
+    await send_code(message.channel, "\n".join(lines))
+
+
+async def cmd_resetlayout(message: discord.Message, args_text: str):
+    key = args_text.strip().lower()
+    if not key:
+        await message.reply("Use: !resetlayout 1170x2532 or !resetlayout all")
+        return
+    if key != "all" and ":" not in key:
+        key = profile_key(message, key)
+    if reset_layout(key):
+        await message.reply(f"Reset layout profile {key}.")
+        await log_action(message, f"Reset layout profile {key}.")
+    else:
+        await message.reply("No layout profile with that resolution.")
+
+
 def format_channel(channel_id):
     if channel_id:
         return f"<#{channel_id}>"
@@ -507,6 +971,8 @@ async def cmd_help(message: discord.Message):
 OCR commands
 !scan bg2
 !scan bg2 debug
+!scan bg2 stitch   (several screenshots of one BG)
+!scan all          (one screenshot per BG)
 !confirm SCANID
 !confirm SCANID bg2
 !confirm SCANID replace
@@ -519,9 +985,10 @@ Viewing
 !viewbg 2
 
 Data management
-!rename "Old Name" "New Name"
-!clear "Player Name"
-!clearbg 2
+!rename "Old Name" "New Name" ["Old Two" "New Two" ...]
+!clear "Player Name" ["Another Player" ...]
+!move bg2 "Player Name" ["Another Player" ...]
+!clearbg 2 [3 ...]
 !wipe confirm
 !exportdata
 !importdata
@@ -530,6 +997,9 @@ Setup
 !setscanchannel CHANNEL_ID
 !setlogchannel CHANNEL_ID
 !config
+!status
+!layouts
+!resetlayout 1170x2532
 """.strip()
     await send_code(message.channel, text)
 
@@ -545,6 +1015,11 @@ async def log_action(message: discord.Message, text: str):
     await channel.send(f"{message.author} used {message.content}\n{text}")
 
 
+def sync_roster(data: dict):
+    # Keeps the Tesseract name word lists in step with the saved players.
+    set_roster([name for names in data.get("battlegroups", {}).values() for name in names])
+
+
 async def send_code(channel, text: str):
     if len(text) <= MAX_MESSAGE:
         await channel.send(f"```txt\n{text}\n```")
@@ -569,7 +1044,13 @@ async def send_code(channel, text: str):
         await channel.send(f"```txt\n{chunk}\n```")
 
 
-if not TOKEN:
-    raise RuntimeError("Missing DISCORD_TOKEN environment variable.")
+add_change_listener(sync_roster)
+read_model.install()
+sync_roster(load_data())
+set_aliases(load_aliases())
+set_header_templates(load_header_templates())
 
-bot.run(TOKEN)
+if __name__ == "__main__":
+    if not TOKEN:
+        raise RuntimeError("Missing DISCORD_TOKEN environment variable.")
+    bot.run(TOKEN)
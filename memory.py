@@ -0,0 +1,137 @@
+import asyncio
+import io
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+from PIL import Image
+
+from ocr_parser import MAX_INPUT_WIDTH, OCR_CONCURRENCY
+
+# Total RSS the bot and its OCR workers may use; the Fly machine has 512 MB.
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "400"))
+# Scans get fewer OCR slots, and with one slot low-memory mode, rather than pass this share.
+PRESSURE_RATIO = 0.8
+# Upscaled crops plus one Tesseract process per OCR slot, on top of the screenshots themselves.
+CROPS_MB = 15
+TESSERACT_MB = 45
+# Pillow keeps RGB images as 4 bytes per pixel.
+BYTES_PER_PIXEL = 4
+MB = 1024 * 1024
+
+
+def rss_mb(pid: Optional[int] = None) -> float:
+    path = f"/proc/{pid}/statm" if pid else "/proc/self/statm"
+    try:
+        with open(path, "r", encoding="ascii") as file:
+            resident_pages = int(file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def scan_overhead_mb(slots: int) -> float:
+    return CROPS_MB + TESSERACT_MB * slots
+
+
+def estimate_scan_mb(images: list[bytes], slots: int = OCR_CONCURRENCY) -> float:
+    # Only the image headers are read here. Every screenshot keeps a panel-sized working
+    # copy for the whole scan; the full decode is transient, so only the largest counts.
+    working = 0.0
+    largest_decode = 0.0
+    for data in images:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+                is_jpeg = image.format == "JPEG"
+        except Exception:
+            continue
+        decode_pixels = width * height
+        if is_jpeg and width > MAX_INPUT_WIDTH:
+            # Draft mode decodes at 1/2, 1/4 or 1/8 scale.
+            reduction = 1
+            while reduction < 8 and width // (reduction * 2) >= MAX_INPUT_WIDTH:
+                reduction *= 2
+            decode_pixels //= reduction * reduction
+        scaled_height = height * min(1.0, MAX_INPUT_WIDTH / max(1, width))
+        working += (len(data) + min(width, MAX_INPUT_WIDTH) * scaled_height * BYTES_PER_PIXEL * 2) / MB
+        largest_decode = max(largest_decode, decode_pixels * BYTES_PER_PIXEL / MB)
+    return scan_overhead_mb(slots) + working + largest_decode
+
+
+class MemoryGovernor:
+    """Admits scans against MEMORY_BUDGET_MB using their estimated peak footprint.
+
+    Scans already running count by their estimates on top of the RSS measured when nothing
+    was running, or by the RSS measured now if that is higher, since it already includes
+    what they have allocated. A scan that would push that past the budget waits until one
+    of them finishes. A scan is never held back when
+    nothing else is running, so one oversized upload still goes through on its own.
+    """
+
+    def __init__(self, budget_mb: float = MEMORY_BUDGET_MB):
+        self.budget_mb = budget_mb
+        self.reserved: dict[int, float] = {}
+        self.waiting = 0
+        self.low_memory_scans = 0
+        self.worker_pids: set[int] = set()
+        self.baseline_mb = 0.0
+        self._changed = asyncio.Condition()
+        self._next_id = 0
+
+    def used_mb(self) -> float:
+        return rss_mb() + sum(rss_mb(pid) for pid in self.worker_pids)
+
+    def projected_mb(self, estimate: float) -> float:
+        used = self.used_mb()
+        if not self.reserved:
+            self.baseline_mb = used
+        return max(used, self.baseline_mb + sum(self.reserved.values())) + estimate
+
+    def choose_slots(self, estimate: Callable[[int], float]) -> tuple[int, bool]:
+        # The most OCR slots that keep the projection under the pressure line; with
+        # not even one, the scan runs in low-memory mode.
+        for slots in range(OCR_CONCURRENCY, 0, -1):
+            if self.projected_mb(estimate(slots)) <= self.budget_mb * PRESSURE_RATIO:
+                return slots, False
+        return 1, True
+
+    @asynccontextmanager
+    async def admit(self, estimate: Callable[[int], float]) -> AsyncIterator[tuple[int, bool]]:
+        # `estimate` gives the scan's peak MB for a number of OCR slots.
+        # Yields the slots the scan may use and whether it should run in low-memory mode.
+        async with self._changed:
+            self.waiting += 1
+            try:
+                while self.reserved and self.projected_mb(estimate(1)) > self.budget_mb:
+                    try:
+                        # RSS also drops when a worker recycles, so re-check now and then.
+                        await asyncio.wait_for(self._changed.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.waiting -= 1
+            slots, low_memory = self.choose_slots(estimate)
+            self._next_id += 1
+            scan_id = self._next_id
+            self.reserved[scan_id] = estimate(slots)
+        if low_memory:
+            self.low_memory_scans += 1
+        try:
+            yield slots, low_memory
+        finally:
+            async with self._changed:
+                self.reserved.pop(scan_id, None)
+                self._changed.notify_all()
+
+    def diagnostics(self) -> dict:
+        return {
+            "bot_rss_mb": round(rss_mb(), 1),
+            "worker_rss_mb": round(sum(rss_mb(pid) for pid in self.worker_pids), 1),
+            "budget_mb": self.budget_mb,
+            "baseline_mb": round(self.baseline_mb, 1),
+            "running_scans": len(self.reserved),
+            "reserved_mb": round(sum(self.reserved.values()), 1),
+            "waiting_scans": self.waiting,
+            "low_memory_scans": self.low_memory_scans,
+        }
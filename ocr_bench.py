@@ -0,0 +1,124 @@
+"""Benchmarks the OCR post-processing path on recorded Tesseract output.
+
+Record real OCR calls first, by running the bot or a scan with OCR_BACKEND=record
+(calls are appended to OCR_FIXTURES, /data/ocr_fixtures.jsonl by default). Then:
+
+    python ocr_bench.py --fixtures ocr_fixtures.jsonl --repeat 1000
+    python ocr_bench.py --fixtures ocr_fixtures.jsonl --images shots/ --scans 50
+
+The first form runs every recorded text through line cleaning, status and name
+extraction with no images involved. The second replays whole scans of the given
+screenshots with the replay backend, so image preparation is included but Tesseract
+is not.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Optional
+
+import ocr_parser
+from ocr_parser import (
+    alias_from_lines,
+    clean_ocr_lines,
+    extract_best_name,
+    lines_have_reserved,
+    load_ocr_fixtures,
+    name_from_reserved_context,
+    parse_battlegroup_image,
+    set_ocr_backend,
+    unique_keep_order,
+)
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def post_process(text: str) -> tuple[list[str], bool, Optional[str]]:
+    # What the row passes do with one Tesseract result.
+    lines = clean_ocr_lines(text)
+    reserved = lines_have_reserved(lines)
+    name = alias_from_lines(lines) or name_from_reserved_context(lines) or extract_best_name(lines)
+    return unique_keep_order(lines), reserved, name
+
+
+def bench_post_processing(calls: list[dict], repeat: int) -> dict:
+    texts = [call["text"] for call in calls]
+    reserved = 0
+    named = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            _, is_reserved, name = post_process(text)
+            reserved += is_reserved
+            named += name is not None
+    elapsed = time.perf_counter() - started
+    processed = len(texts) * repeat
+    return {
+        "recorded_calls": len(texts),
+        "calls_by_kind": dict(Counter(call.get("kind", "?") for call in calls)),
+        "processed": processed,
+        "elapsed_s": round(elapsed, 3),
+        "texts_per_s": round(processed / elapsed, 1) if elapsed else 0.0,
+        "us_per_text": round(elapsed / processed * 1_000_000, 2) if processed else 0.0,
+        "reserved_share": round(reserved / processed, 3) if processed else 0.0,
+        "named_share": round(named / processed, 3) if processed else 0.0,
+    }
+
+
+def bench_replayed_scans(folder: str, scans: int) -> dict:
+    images = [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith(IMAGE_SUFFIXES)
+    ]
+    if not images:
+        return {"scans": 0}
+    data = []
+    for path in images:
+        with open(path, "rb") as file:
+            data.append(file.read())
+
+    durations = []
+    for index in range(scans):
+        started = time.perf_counter()
+        parse_battlegroup_image(data[index % len(data)], battlegroup_override=1)
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    total = sum(durations)
+    return {
+        "scans": scans,
+        "images": len(images),
+        "elapsed_s": round(total, 3),
+        "scans_per_s": round(scans / total, 2) if total else 0.0,
+        "p50_s": round(durations[len(durations) // 2], 4),
+        "max_s": round(durations[-1], 4),
+        "replay_misses": ocr_parser.replay_misses,
+    }
+
+
+def main_cli(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark OCR post-processing on recorded Tesseract output.")
+    parser.add_argument("--fixtures", default=ocr_parser.OCR_FIXTURES, help="recorded OCR calls (JSON lines)")
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the recorded texts")
+    parser.add_argument("--images", help="also replay whole scans of the screenshots in this folder")
+    parser.add_argument("--scans", type=int, default=20, help="replayed scans to run with --images")
+    args = parser.parse_args(argv)
+
+    calls = load_ocr_fixtures(args.fixtures)
+    if not calls:
+        print(f"No recorded OCR calls in {args.fixtures}. Record some with OCR_BACKEND=record.", file=sys.stderr)
+        return 1
+
+    report = {"post_processing": bench_post_processing(calls, max(1, args.repeat))}
+    if args.images:
+        set_ocr_backend("replay", args.fixtures)
+        report["replayed_scans"] = bench_replayed_scans(args.images, max(1, args.scans))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,14 +1,20 @@
+import asyncio
+import contextlib
+import contextvars
 import csv
+import hashlib
 import io
+import json
 import os
 import re
-import subprocess
-import tempfile
-from dataclasses import dataclass
+import time
+from dataclasses import asdict, dataclass, field, replace
 from difflib import SequenceMatcher
 from typing import Optional
 
-from PIL import Image, ImageOps, ImageFilter, ImageEnhance, ImageStat
+from PIL import Image, ImageChops, ImageOps, ImageFilter, ImageEnhance, ImageStat
+
+from storage import DATA_DIR
 
 
 @dataclass
@@ -19,6 +25,14 @@ class RowDebug:
     reserved: bool
     name: Optional[str]
     box: tuple[int, int, int, int]
+    image: int = 1
+    fingerprint: str = ""
+    # Finer fingerprint of the name box alone, so reuse cannot swap two similar-looking cards.
+    name_print: str = ""
+    # "ocr" when the row was read in this scan, "reused" when copied from the previous accepted scan.
+    source: str = "ocr"
+    # False when the scan deadline ran out before every pass this row needed had run.
+    complete: bool = True
 
 
 @dataclass
@@ -28,6 +42,19 @@ class ScanResult:
     header_text: str
     rows: list[RowDebug]
     panel_box: tuple[int, int, int, int]
+    notes: list[str] = field(default_factory=list)
+    # Size of the first screenshot as uploaded, before normalize_input_size.
+    image_size: tuple[int, int] = (0, 0)
+    # Screenshots given to the scan, including any that added no new rows.
+    image_count: int = 1
+    # Row boxes used on the first screenshot, for saving as a layout profile.
+    row_layout: list[dict[str, tuple[int, int, int, int]]] = field(default_factory=list)
+    # Layout profile key used for the first screenshot, or "" when geometry was detected.
+    layout_profile: str = ""
+    # Thumbnail of the header's battlegroup digit, learned as a template on a clean confirm.
+    header_glyph: str = ""
+    # How the first screenshot's panel was found: "edges", "buckets" or "layout".
+    panel_method: str = ""
 
 
 BAD_NAME_WORDS = {
@@ -43,52 +70,662 @@ RESERVED_FRAGMENTS = {
     "RVED", "RVE", "RVEL", "RVD", "RSERVED", "RESRVED", "REERVED",
 }
 
+# A whole status line other than RESERVED, as left by clean_ocr_lines.
+OTHER_STATUS_LINE = re.compile(r"ASSIGNED|IN ?FIGHT|K\.? ?O\.?")
+
 STATUS_WORDS = set(RESERVED_FRAGMENTS).union({
     "ASSIGNED", "IN", "FIGHT", "INFIGHT", "K", "KO", "PTS",
 })
 
+# Per-call cap for one Tesseract run; a scan deadline can shorten it further.
+TESSERACT_TIMEOUT = 5.0
+# Passes are not started with less than this left, since they would only time out.
+MIN_PASS_TIME = 0.5
+
+# Screenshots are decoded at most this wide; 1600 keeps name text readable on a 512 MB machine.
+MAX_INPUT_WIDTH = 1600
+# Under memory pressure crops are upscaled at most this much and the binary fallback is skipped.
+LOW_MEMORY_MAX_SCALE = 3
+# Uploads larger than this are refused before decoding.
+MAX_DECODE_PIXELS = 40_000_000
+
+# Tesseract's LSTM reads best when a text line is roughly 30-40 px tall.
+# Crops are only upscaled far enough to reach this, never past the caller's max scale.
+TARGET_TEXT_HEIGHT = 34
+# Phone screenshots are effectively ~72 DPI; Tesseract gets the DPI of the upscaled crop.
+SOURCE_DPI = 72
+
+# Tesseract processes one scan may run at once. Rows, the header and speculative passes
+# share these slots; on one CPU the binary full pass waits for the gray one instead.
+OCR_CONCURRENCY = max(1, int(os.getenv("OCR_CONCURRENCY", str(min(4, os.cpu_count() or 1)))))
+_ocr_slots: contextvars.ContextVar[Optional[asyncio.Semaphore]] = contextvars.ContextVar("ocr_slots", default=None)
+
+# Where OCR text comes from. "record" runs Tesseract and appends every call's crop digest
+# and output to OCR_FIXTURES; "replay" serves those outputs back without Tesseract.
+OCR_BACKEND = os.getenv("OCR_BACKEND", "tesseract")
+OCR_FIXTURES = os.getenv("OCR_FIXTURES", os.path.join(DATA_DIR, "ocr_fixtures.jsonl"))
+_replay: Optional[dict[str, str]] = None
+replay_misses = 0
+
+# Tesseract config profiles by crop type. The default English dictionary fights gamer tags
+# and the header/status crops only ever hold a few fixed words, so every profile turns the
+# system dictionaries off and supplies its own word list instead.
+TESSERACT_PROFILE_DIR = os.path.join(DATA_DIR, "tesseract")
+HEADER_WORDS = ["BATTLEGROUP", "BATTLE", "GROUP"]
+HEADER_PATTERNS = ["BATTLEGROUP \\d", "GROUP \\d"]
+STATUS_VOCABULARY = ["RESERVED", "ASSIGNED", "IN", "FIGHT", "K.O.", "PTS"]
+NO_DICTIONARY_ARGS = ["-c", "load_system_dawg=0", "-c", "load_freq_dawg=0"]
+
+_roster_digest: Optional[str] = None
+_profile_args: dict[str, list[str]] = {}
+
+# Learned OCR mis-reads from !editscan corrections: casefolded OCR text -> confirmed name.
+_aliases: dict[str, str] = {}
+# How similar a mis-read must be to the corrected name to be learned as its alias.
+ALIAS_MIN_RATIO = 0.5
+
+# Battlegroup digit templates learned from clean confirms: battlegroup -> glyph thumbnails.
+# A header whose digit correlates well with one battlegroup's templates, and clearly
+# better than with any other's, is read without Tesseract. With templates for a single
+# battlegroup there is nothing to tell it apart from, so the header is read instead.
+_header_templates: dict[int, list[str]] = {}
+HEADER_GLYPH_SIZE = (12, 20)
+HEADER_MIN_CORRELATION = 0.8
+HEADER_MIN_MARGIN = 0.2
+HEADER_MIN_TEMPLATE_BGS = 2
+
+# Adaptive binarisation: a pixel is text when it is this much brighter than the mean of its
+# neighbourhood, so gradient panel backgrounds need no global threshold sweep.
+ADAPTIVE_OFFSET = 14
+
+# Panel borders are found on a copy this wide. A border is a column (or row) where the
+# brightness steps by more than PANEL_EDGE_STEP along most of the panel's length.
+PANEL_PROFILE_WIDTH = 320
+PANEL_EDGE_STEP = 18
+PANEL_EDGE_COVERAGE = 0.6
+# Detected panels narrower than this share of the screenshot are rejected as noise.
+PANEL_MIN_WIDTH = 0.35
+
+# Player cards are found the same way, from horizontal steps across the middle of the
+# panel. A card is a band between two such steps; bands whose height is not within
+# CARD_HEIGHT_TOLERANCE of the typical card are headers, gaps or rows cut off by scrolling.
+CARD_MIN_HEIGHT = 0.06
+# Cards differ less from the panel than the panel does from the background, and the
+# downsampled step is spread over two pixels.
+CARD_EDGE_STEP = 10
+CARD_HEIGHT_TOLERANCE = 0.25
+CARD_MIN_COUNT = 2
+
+# Row fingerprints are small grayscale thumbnails of the row crop, contrast-stretched so
+# brightness shifts between captures do not matter. Two rows match when almost no cell
+# differs strongly; a changed name or status word moves a whole block of cells.
+FINGERPRINT_SIZE = (64, 16)
+FINGERPRINT_CELL_TOLERANCE = 32
+FINGERPRINT_MAX_CHANGED = 0.005
+# Consecutive scrolled screenshots are not pixel aligned, so overlap detection uses
+# normalised correlation instead, which tolerates a few pixels of vertical drift.
+FINGERPRINT_MIN_CORRELATION = 0.95
+NAME_FINGERPRINT_SIZE = (80, 16)
+# A row is reused from the last accepted scan when its box is within this share of the
+# row height of the old one on every edge, and both its fingerprints match strictly.
+REUSE_BOX_TOLERANCE = 0.1
+
+# Stitched screenshots are aligned by how far the list scrolled between them: the row
+# area of each is shrunk to a thin strip, and the shift at which the previous strip's
+# bottom best matches this strip's top is the scroll. Rows that lie inside the part both
+# screenshots show were already read, wherever the row boxes happen to fall.
+STITCH_STRIP_WIDTH = 24
+STITCH_STRIP_MAX_HEIGHT = 300
+# Mean gray-level difference above which two strips are taken not to overlap at all.
+STITCH_MAX_DIFFERENCE = 12.0
+# Share of the row area a row may stick out past the previous screenshot and still count as seen.
+STITCH_ROW_TOLERANCE = 0.03
+
+
+def parse_battlegroup_image(
+    image_bytes: bytes,
+    battlegroup_override: Optional[int] = None,
+    previous: Optional[dict[int, ScanResult]] = None,
+    budget: Optional[float] = None,
+    layouts: Optional[dict[str, dict]] = None,
+    battlegroup_hint: Optional[int] = None,
+    low_memory: bool = False,
+    ocr_slots: Optional[int] = None,
+) -> ScanResult:
+    return parse_battlegroup_images(
+        [image_bytes], battlegroup_override, previous, budget,
+        layouts=layouts, battlegroup_hint=battlegroup_hint, low_memory=low_memory, ocr_slots=ocr_slots,
+    )
 
-def parse_battlegroup_image(image_bytes: bytes, battlegroup_override: Optional[int] = None) -> ScanResult:
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    image = normalize_input_size(image)
-    panel = find_panel_box(image)
 
+def parse_battlegroup_images(
+    images: list[bytes],
+    battlegroup_override: Optional[int] = None,
+    previous: Optional[dict[int, ScanResult]] = None,
+    budget: Optional[float] = None,
+    layouts: Optional[dict[str, dict]] = None,
+    battlegroup_hint: Optional[int] = None,
+    low_memory: bool = False,
+    ocr_slots: Optional[int] = None,
+) -> ScanResult:
+    return asyncio.run(parse_battlegroup_images_async(
+        images, battlegroup_override, previous, budget,
+        layouts=layouts, battlegroup_hint=battlegroup_hint, low_memory=low_memory, ocr_slots=ocr_slots,
+    ))
+
+
+async def parse_battlegroup_images_async(
+    images: list[bytes],
+    battlegroup_override: Optional[int] = None,
+    previous: Optional[dict[int, ScanResult]] = None,
+    budget: Optional[float] = None,
+    layouts: Optional[dict[str, dict]] = None,
+    battlegroup_hint: Optional[int] = None,
+    low_memory: bool = False,
+    ocr_slots: Optional[int] = None,
+) -> ScanResult:
+    # Several screenshots of one scrolled battlegroup list. Rows already seen in the
+    # previous screenshot are detected by fingerprint and not OCRed again.
+    # `previous` maps battlegroup -> last accepted scan; unchanged rows are copied from it.
+    # `budget` caps the whole scan in seconds; rows left unfinished are marked incomplete.
+    # `layouts` maps "WxH" upload sizes to saved panel and row boxes that skip detection.
+    # `battlegroup_hint` is a guess from the channel name, used only when the header is unclear.
+    # `low_memory` trades accuracy for a smaller footprint: smaller upscales, fewer fallbacks.
+    # `ocr_slots` caps the concurrent OCR reads below OCR_CONCURRENCY when memory is short.
+    deadline = time.monotonic() + budget if budget else None
     header_text = ""
     battlegroup = battlegroup_override
-    if battlegroup is None:
-        header_box = relative_box(panel, 0.24, 0.025, 0.76, 0.155)
-        header_text = ocr_text(image, header_box, psm=7, scale=3, mode="gray")
-        if not header_text:
-            header_text = ocr_text(image, header_box, psm=7, scale=3, mode="binary")
-        battlegroup = extract_battlegroup(header_text)
-
-    rows: list[RowDebug] = []
-    reserved_names: list[str] = []
-
-    for index, row in enumerate(row_boxes(panel), start=1):
-        result = parse_row(image, row, index)
-        rows.append(result)
-        if result.reserved and result.name:
-            reserved_names.append(result.name)
+    panel_box = (0, 0, 0, 0)
+    panel_method = ""
+    slots: list = []
+    notes: list[str] = []
+    previous_prints: list[str] = []
+    previous_strip: Optional[Image.Image] = None
+    reusable: list[RowDebug] = []
+    image_size = (0, 0)
+    row_layout: list[dict[str, tuple[int, int, int, int]]] = []
+    layout_profile = ""
+    header_glyph = ""
+    max_scale = LOW_MEMORY_MAX_SCALE if low_memory else None
+    if low_memory:
+        notes.append("Low-memory mode: smaller upscales and no binary fallback pass")
+    ocr_slots = 1 if low_memory else min(OCR_CONCURRENCY, ocr_slots or OCR_CONCURRENCY)
+    _ocr_slots.set(asyncio.Semaphore(ocr_slots))
+    header_task: Optional[asyncio.Task] = None
+    candidates: list[RowDebug] = []
+    deferred: list[RowWork] = []
+    kept_images: list[Image.Image] = []
+
+    for image_index, image_bytes in enumerate(images, start=1):
+        image, original_size = load_scan_image(image_bytes)
+        key = layout_key(original_size)
+        profile = (layouts or {}).get(key)
+        # A saved profile fixes the panel only: which cards show depends on how far the
+        # list is scrolled, so rows are still detected and the saved ones are the fallback.
+        if profile:
+            panel, saved_boxes = profile_geometry(profile)
+            method = "layout"
+        else:
+            panel, method = locate_panel(image)
+            saved_boxes = row_boxes(panel)
+        detected = detect_row_boxes(image, panel)
+        boxes = detected or saved_boxes
+        if image_index == 1:
+            panel_box = panel
+            panel_method = method
+            notes.append(f"{len(boxes)} row(s) on image 1")
+            image_size = original_size
+            row_layout = boxes
+            if profile:
+                layout_profile = key
+                source = "detected" if detected else "saved"
+                notes.append(f"Layout profile {key} used for the panel ({source} rows)")
+
+        # Only the panel is kept for OCR; boxes from here on are relative to it.
+        image, panel, boxes = crop_to_panel(image, panel, boxes)
+        if image_index == 1:
+            header_glyph = header_digit_glyph(image, panel)
+            if battlegroup is None:
+                battlegroup, score = classify_header_digit(header_glyph)
+                if battlegroup is not None:
+                    notes.append(f"BG{battlegroup} matched a learned header digit ({score:.2f})")
+            if battlegroup is None:
+                # The header is read alongside the rows. Only rows that match a row of
+                # some battlegroup's last accepted scan wait for it, to see if they are reused.
+                header_task = asyncio.create_task(read_header(image, panel, deadline))
+                candidates = [row for result in (previous or {}).values() for row in reusable_rows(result)]
+            elif previous and battlegroup in previous:
+                reusable = reusable_rows(previous[battlegroup])
+
+        prints = [row_fingerprint(image, row["full"]) for row in boxes]
+        strip = row_area_strip(image, boxes)
+        overlap = scrolled_overlap(previous_strip, strip, boxes)
+        if overlap is None:
+            overlap = find_overlap(previous_prints, prints)
+        if image_index > 1:
+            notes.append(f"Image {image_index}: {overlap} row(s) overlap image {image_index - 1}")
+
+        for row, fingerprint in zip(boxes[overlap:], prints[overlap:]):
+            work = RowWork(
+                index=len(slots) + 1, image=image, image_index=image_index, boxes=row,
+                fingerprint=fingerprint, name_print=row_fingerprint(image, row["name"], NAME_FINGERPRINT_SIZE),
+                max_scale=max_scale, binary_fallback=not low_memory,
+                # Recorded and replayed scans read in a fixed order, so replays match recordings.
+                speculative=ocr_slots > 1 and OCR_BACKEND == "tesseract",
+            )
+            if header_task is not None and candidates and reuse_candidate(work, candidates):
+                deferred.append(work)
+            slots.append(reuse_row(work, reusable) or work)
+        previous_prints = prints
+        if previous_strip is not None:
+            previous_strip.close()
+        previous_strip = strip
+        in_use = any(isinstance(slot, RowWork) and slot.image is image for slot in slots)
+        if in_use or (image_index == 1 and header_task is not None):
+            kept_images.append(image)
+        else:
+            image.close()
+
+    waiting = {id(work) for work in deferred}
+    works = [slot for slot in slots if isinstance(slot, RowWork) and id(slot) not in waiting]
+    passes = [asyncio.create_task(run_row_passes(works, deadline))]
+    try:
+        if header_task is not None:
+            header_text = await header_task
+            battlegroup = header_battlegroup(header_text, battlegroup_hint, notes)
+            reusable = reusable_rows(previous[battlegroup]) if previous and battlegroup in previous else []
+            rest = []
+            for work in deferred:
+                reused = reuse_row(work, reusable)
+                if reused is None:
+                    rest.append(work)
+                else:
+                    slots[work.index - 1] = reused
+            passes.append(asyncio.create_task(run_row_passes(rest, deadline)))
+        await asyncio.gather(*passes)
+    finally:
+        # A failed read in one task must not leave the others running.
+        tasks = passes + ([header_task] if header_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    rows = [slot.finish() if isinstance(slot, RowWork) else slot for slot in slots]
+    for image in kept_images:
+        image.close()
+    if previous_strip is not None:
+        previous_strip.close()
+    reserved_names = [row.name for row in rows if row.reserved and row.name]
+    if deadline and not all(row.complete for row in rows):
+        notes.append(f"Scan budget of {budget:g}s ran out before every row was fully read")
 
     return ScanResult(
         battlegroup=battlegroup,
         reserved_names=unique_keep_order(reserved_names),
         header_text=header_text,
         rows=rows,
-        panel_box=panel,
+        panel_box=panel_box,
+        panel_method=panel_method,
+        notes=notes,
+        image_size=image_size,
+        image_count=len(images),
+        row_layout=row_layout,
+        layout_profile=layout_profile,
+        header_glyph=header_glyph,
+    )
+
+
+def crop_to_panel(
+    image: Image.Image,
+    panel: tuple[int, int, int, int],
+    boxes: list[dict[str, tuple[int, int, int, int]]],
+) -> tuple[Image.Image, tuple[int, int, int, int], list[dict[str, tuple[int, int, int, int]]]]:
+    panel = clamp_box(panel, image.size)
+    x, y = panel[0], panel[1]
+    cropped = image.crop(panel)
+    image.close()
+    local_boxes = [
+        {name: (box[0] - x, box[1] - y, box[2] - x, box[3] - y) for name, box in row.items()}
+        for row in boxes
+    ]
+    return cropped, (0, 0, cropped.width, cropped.height), local_boxes
+
+
+def layout_key(size: tuple[int, int]) -> str:
+    return f"{size[0]}x{size[1]}"
+
+
+def profile_geometry(profile: dict) -> tuple[tuple[int, int, int, int], list[dict[str, tuple[int, int, int, int]]]]:
+    panel = tuple(profile["panel"])
+    rows = [{name: tuple(box) for name, box in row.items()} for row in profile["rows"]]
+    return panel, rows
+
+
+def scan_result_to_dict(result: ScanResult) -> dict:
+    return asdict(result)
+
+
+def scan_result_from_dict(data: dict) -> ScanResult:
+    # JSON turns the box tuples into lists; rows are matched by box, so restore them.
+    rows = [RowDebug(**{**row, "box": tuple(row["box"])}) for row in data.get("rows", [])]
+    row_layout = [{name: tuple(box) for name, box in row.items()} for row in data.get("row_layout", [])]
+    return ScanResult(**{
+        **data,
+        "rows": rows,
+        "panel_box": tuple(data["panel_box"]),
+        "image_size": tuple(data.get("image_size", (0, 0))),
+        "row_layout": row_layout,
+    })
+
+
+def time_left(deadline: Optional[float]) -> float:
+    if deadline is None:
+        return TESSERACT_TIMEOUT
+    return min(TESSERACT_TIMEOUT, deadline - time.monotonic())
+
+
+def reusable_rows(result: ScanResult) -> list[RowDebug]:
+    return [row for row in result.rows if row.fingerprint and row.name_print]
+
+
+def reuse_row(work: "RowWork", candidates: list[RowDebug]) -> Optional[RowDebug]:
+    old = match_reusable(candidates, work.image_index, work.boxes["full"], work.fingerprint, work.name_print)
+    if old is None:
+        return None
+    candidates.remove(old)
+    return replace(
+        old, row=work.index, box=work.boxes["full"], fingerprint=work.fingerprint,
+        name_print=work.name_print, source="reused",
+    )
+
+
+def reuse_candidate(work: "RowWork", candidates: list[RowDebug]) -> bool:
+    return match_reusable(candidates, work.image_index, work.boxes["full"], work.fingerprint, work.name_print) is not None
+
+
+def match_reusable(
+    candidates: list[RowDebug],
+    image_index: int,
+    box: tuple[int, int, int, int],
+    fingerprint: str,
+    name_print: str,
+) -> Optional[RowDebug]:
+    # The same screenshot position give or take a few pixels, showing the same card and
+    # the same name. Boxes only line up when the resolution and panel layout repeat.
+    slack = (box[3] - box[1]) * REUSE_BOX_TOLERANCE
+    for old in candidates:
+        if old.image != image_index or any(abs(a - b) > slack for a, b in zip(old.box, box)):
+            continue
+        if fingerprints_match(old.fingerprint, fingerprint) and fingerprints_match(old.name_print, name_print):
+            return old
+    return None
+
+
+def load_scan_image(image_bytes: bytes) -> tuple[Image.Image, tuple[int, int]]:
+    source = Image.open(io.BytesIO(image_bytes))
+    original_size = source.size
+    width, height = original_size
+    if width * height > MAX_DECODE_PIXELS:
+        raise ValueError(f"Screenshot is {width}x{height}; the limit is {MAX_DECODE_PIXELS // 1_000_000} megapixels.")
+    if width > MAX_INPUT_WIDTH and source.format == "JPEG":
+        # JPEG can be scaled by 1/2, 1/4 or 1/8 inside the decoder, so the full-size
+        # bitmap is never built. PNG and WebP have no such mode in Pillow.
+        source.draft("RGB", (MAX_INPUT_WIDTH, max(1, height * MAX_INPUT_WIDTH // width)))
+    image = source.convert("RGB")
+    source.close()
+    if image.width >= MAX_INPUT_WIDTH * 2:
+        # Integer box reduction first, so the LANCZOS pass works on a smaller bitmap.
+        image = image.reduce(image.width // MAX_INPUT_WIDTH)
+    return normalize_input_size(image), original_size
+
+
+def header_battlegroup(header_text: str, hint: Optional[int], notes: list[str]) -> Optional[int]:
+    battlegroup = extract_battlegroup(header_text)
+    if battlegroup is None and hint is not None:
+        battlegroup = hint
+        notes.append(f"BG{battlegroup} taken from the channel name")
+    return battlegroup
+
+
+async def read_header(image: Image.Image, panel: tuple[int, int, int, int], deadline: Optional[float] = None) -> str:
+    header_box = relative_box(panel, 0.24, 0.025, 0.76, 0.155)
+    header_text = ""
+    try:
+        header_text = await ocr_text(image, header_box, psm=7, scale=3, mode="gray", kind="header", deadline=deadline)
+        if not header_text and time_left(deadline) >= MIN_PASS_TIME:
+            header_text = await ocr_text(image, header_box, psm=7, scale=3, mode="binary", kind="header", deadline=deadline)
+    except TimeoutError:
+        pass
+    return header_text
+
+
+def header_digit_glyph(image: Image.Image, panel: tuple[int, int, int, int]) -> str:
+    # The battlegroup number is the right-most glyph on the header line. It is cut out
+    # of the binarised line by its column profile and shrunk to a fixed thumbnail.
+    lines = locate_text_lines(image, relative_box(panel, 0.24, 0.025, 0.76, 0.155))
+    if not lines:
+        return ""
+    line = max(lines, key=lambda box: box[3] - box[1])
+    gray = ImageOps.autocontrast(image.crop(line).convert("L"), cutoff=1)
+    mask = ImageOps.invert(adaptive_binarize(gray))
+    columns = list(mask.resize((mask.width, 1), Image.Resampling.BOX).getdata())
+    runs = []
+    start = None
+    for x, value in enumerate(columns + [0]):
+        if value > 0 and start is None:
+            start = x
+        elif value == 0 and start is not None:
+            runs.append((start, x))
+            start = None
+    for left, right in reversed(runs):
+        glyph = mask.crop((left, 0, right, mask.height))
+        top_bottom = glyph.getbbox()
+        # Skip specks; the digit is about as tall as the capitals before it.
+        if top_bottom and top_bottom[3] - top_bottom[1] >= mask.height * 0.4:
+            glyph = glyph.crop((0, top_bottom[1], glyph.width, top_bottom[3]))
+            return glyph.resize(HEADER_GLYPH_SIZE, Image.Resampling.BOX).tobytes().hex()
+    return ""
+
+
+def set_header_templates(templates: dict[str, list[str]]) -> None:
+    global _header_templates
+    _header_templates = {int(bg): list(glyphs) for bg, glyphs in templates.items() if glyphs}
+
+
+def classify_header_digit(glyph: str) -> tuple[Optional[int], float]:
+    if not glyph or len(_header_templates) < HEADER_MIN_TEMPLATE_BGS:
+        return None, 0.0
+    scores = {
+        bg: max(fingerprint_correlation(glyph, template) for template in templates)
+        for bg, templates in _header_templates.items()
+    }
+    best = max(scores, key=scores.get)
+    runner_up = max(score for bg, score in scores.items() if bg != best)
+    if scores[best] >= HEADER_MIN_CORRELATION and scores[best] - runner_up >= HEADER_MIN_MARGIN:
+        return best, scores[best]
+    return None, scores[best]
+
+
+def row_fingerprint(image: Image.Image, box: tuple[int, int, int, int], size: tuple[int, int] = FINGERPRINT_SIZE) -> str:
+    crop = image.crop(clamp_box(box, image.size)).convert("L")
+    thumb = ImageOps.autocontrast(crop.resize(size, Image.Resampling.BOX))
+    return thumb.tobytes().hex()
+
+
+def fingerprints_match(a: str, b: str) -> bool:
+    if not a or not b or len(a) != len(b):
+        return False
+    left = bytes.fromhex(a)
+    right = bytes.fromhex(b)
+    changed = sum(abs(x - y) > FINGERPRINT_CELL_TOLERANCE for x, y in zip(left, right))
+    return changed / len(left) <= FINGERPRINT_MAX_CHANGED
+
+
+def fingerprints_similar(a: str, b: str) -> bool:
+    return fingerprint_correlation(a, b) >= FINGERPRINT_MIN_CORRELATION
+
+
+def fingerprint_correlation(a: str, b: str) -> float:
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    left = bytes.fromhex(a)
+    right = bytes.fromhex(b)
+    left_mean = sum(left) / len(left)
+    right_mean = sum(right) / len(right)
+    cov = left_var = right_var = 0.0
+    for x, y in zip(left, right):
+        dx = x - left_mean
+        dy = y - right_mean
+        cov += dx * dy
+        left_var += dx * dx
+        right_var += dy * dy
+    if not left_var or not right_var:
+        # Blank rows only match other blank rows.
+        return 1.0 if not left_var and not right_var else 0.0
+    return cov / (left_var * right_var) ** 0.5
+
+
+def row_area_box(boxes: list[dict[str, tuple[int, int, int, int]]]) -> tuple[int, int, int, int]:
+    fulls = [row["full"] for row in boxes]
+    return (
+        min(box[0] for box in fulls),
+        min(box[1] for box in fulls),
+        max(box[2] for box in fulls),
+        max(box[3] for box in fulls),
     )
 
 
+def row_area_strip(image: Image.Image, boxes: list[dict[str, tuple[int, int, int, int]]]) -> Optional[Image.Image]:
+    if not boxes:
+        return None
+    area = clamp_box(row_area_box(boxes), image.size)
+    if area[3] - area[1] < 8:
+        return None
+    height = min(STITCH_STRIP_MAX_HEIGHT, area[3] - area[1])
+    with image.crop(area) as crop:
+        gray = crop.convert("L")
+    strip = gray.resize((STITCH_STRIP_WIDTH, height), Image.Resampling.BOX)
+    gray.close()
+    return strip
+
+
+def scroll_offset(previous: Image.Image, current: Image.Image, min_overlap: int) -> Optional[int]:
+    # Strip rows the list moved up between the two screenshots, or None when no shift lines them up.
+    if previous.size != current.size:
+        return None
+    width, height = current.size
+    best: Optional[tuple[float, int]] = None
+    for shift in range(0, height - max(1, min_overlap) + 1):
+        with previous.crop((0, shift, width, height)) as tail, current.crop((0, 0, width, height - shift)) as head:
+            with ImageChops.difference(tail, head) as diff:
+                score = ImageStat.Stat(diff).mean[0]
+        if best is None or score < best[0]:
+            best = (score, shift)
+    if best is None or best[0] > STITCH_MAX_DIFFERENCE:
+        return None
+    return best[1]
+
+
+def scrolled_overlap(
+    previous_strip: Optional[Image.Image],
+    strip: Optional[Image.Image],
+    boxes: list[dict[str, tuple[int, int, int, int]]],
+) -> Optional[int]:
+    # Leading rows of this screenshot that the previous one already showed in full.
+    if previous_strip is None or strip is None:
+        return None
+    top, bottom = row_area_box(boxes)[1::2]
+    ratio = (bottom - top) / strip.height
+    shortest = min(row["full"][3] - row["full"][1] for row in boxes)
+    shift = scroll_offset(previous_strip, strip, max(1, round(shortest / ratio)))
+    if shift is None:
+        return None
+    limit = (bottom - top) * (1 + STITCH_ROW_TOLERANCE)
+    overlap = 0
+    for row in boxes:
+        if row["full"][3] - top + shift * ratio > limit:
+            break
+        overlap += 1
+    return overlap
+
+
+def find_overlap(previous: list[str], current: list[str]) -> int:
+    # Largest n where the last n rows of the previous screenshot are the first n rows of this one.
+    for size in range(min(len(previous), len(current)), 0, -1):
+        tail = previous[len(previous) - size:]
+        if all(fingerprints_similar(a, b) for a, b in zip(tail, current[:size])):
+            return size
+    return 0
+
+
 def normalize_input_size(image: Image.Image) -> Image.Image:
-    # 1600 keeps name text readable while staying realistic for a 512 MB Fly machine.
-    max_width = 1600
+    max_width = MAX_INPUT_WIDTH
     if image.width <= max_width:
         return image
     ratio = max_width / image.width
     return image.resize((max_width, int(image.height * ratio)), Image.Resampling.LANCZOS)
 
 
+def locate_panel(image: Image.Image) -> tuple[tuple[int, int, int, int], str]:
+    detected = detect_panel_box(image)
+    if detected is not None:
+        return detected, "edges"
+    return find_panel_box(image), "buckets"
+
+
+def detect_panel_box(image: Image.Image) -> Optional[tuple[int, int, int, int]]:
+    # Finds the panel's own borders from brightness-step profiles on a small gray copy,
+    # so notches, split screen and odd UI scales do not shift the row crops.
+    w, h = image.size
+    if w < PANEL_PROFILE_WIDTH:
+        return None
+    ratio = w / PANEL_PROFILE_WIDTH
+    small = image.resize((PANEL_PROFILE_WIDTH, max(8, round(h / ratio))), Image.Resampling.BOX).convert("L")
+    sw, sh = small.size
+
+    columns = edge_profile(small, vertical=True)
+    left = outermost(columns, int(sw * 0.02), int(sw * 0.45), from_start=True)
+    right = outermost(columns, int(sw * 0.55), len(columns), from_start=False)
+    if left is None or right is None or right - left < sw * PANEL_MIN_WIDTH:
+        return None
+
+    # Horizontal borders only need to span the panel, not the whole screenshot.
+    inside = small.crop((left, 0, right + 1, sh))
+    rows = edge_profile(inside, vertical=False)
+    top = outermost(rows, 0, int(sh * 0.4), from_start=True)
+    bottom = outermost(rows, int(sh * 0.6), len(rows), from_start=False)
+    fallback = find_panel_box(image)
+    # Profile index i is the step between pixels i and i + 1.
+    return (
+        round((left + 1) * ratio),
+        round((top + 1) * ratio) if top is not None else fallback[1],
+        round((right + 1) * ratio),
+        round((bottom + 1) * ratio) if bottom is not None else fallback[3],
+    )
+
+
+def edge_profile(gray: Image.Image, vertical: bool, step: int = PANEL_EDGE_STEP, span: int = 1) -> list[float]:
+    # Share of each column (vertical=True) or row that sits on a brightness step of more
+    # than `step` across `span` pixels.
+    w, h = gray.size
+    if vertical:
+        steps = ImageChops.difference(gray.crop((span, 0, w, h)), gray.crop((0, 0, w - span, h)))
+        size = (w - span, 1)
+    else:
+        steps = ImageChops.difference(gray.crop((0, span, w, h)), gray.crop((0, 0, w, h - span)))
+        size = (1, h - span)
+    mask = steps.point(lambda p: 255 if p > step else 0)
+    return [value / 255 for value in mask.resize(size, Image.Resampling.BOX).getdata()]
+
+
+def outermost(profile: list[float], start: int, stop: int, from_start: bool) -> Optional[int]:
+    positions = range(start, stop) if from_start else range(stop - 1, start - 1, -1)
+    for position in positions:
+        if profile[position] >= PANEL_EDGE_COVERAGE:
+            return position
+    return None
+
+
 def find_panel_box(image: Image.Image) -> tuple[int, int, int, int]:
     # The MCOC panel is centered, but the exact screenshot can include extra side UI.
     # These bounds intentionally include the full list area and ignore outer space background.
@@ -113,6 +750,56 @@ def relative_box(panel: tuple[int, int, int, int], x1: float, y1: float, x2: flo
     )
 
 
+def detect_row_boxes(image: Image.Image, panel: tuple[int, int, int, int]) -> list[dict[str, tuple[int, int, int, int]]]:
+    # One row per player card actually visible, however many the screenshot shows.
+    # Returns [] unless at least two cards of consistent height are found; callers fall
+    # back to row_boxes.
+    panel = clamp_box(panel, image.size)
+    width = panel[2] - panel[0]
+    height = panel[3] - panel[1]
+    if width < 40 or height < 40:
+        return []
+    ratio = max(1.0, width / PANEL_PROFILE_WIDTH)
+    middle = image.crop((panel[0] + int(width * 0.1), panel[1], panel[2] - int(width * 0.1), panel[3]))
+    small = middle.resize((max(8, round(middle.width / ratio)), max(8, round(middle.height / ratio))), Image.Resampling.BOX)
+    profile = edge_profile(small.convert("L"), vertical=False, step=CARD_EDGE_STEP, span=2)
+
+    edges = []
+    for y, coverage in enumerate(profile):
+        if coverage >= PANEL_EDGE_COVERAGE:
+            if edges and y - edges[-1][1] <= 1:
+                edges[-1] = (edges[-1][0], y)
+            else:
+                edges.append((y, y))
+    bands = [(upper[1] + 1, lower[0] + 1) for upper, lower in zip(edges, edges[1:])]
+    bands = [(top, bottom) for top, bottom in bands if bottom - top >= small.height * CARD_MIN_HEIGHT]
+    if not bands:
+        return []
+    typical = sorted(bottom - top for top, bottom in bands)[len(bands) // 2]
+    cards = [
+        (panel[1] + round(top * ratio), panel[1] + round(bottom * ratio))
+        for top, bottom in bands
+        if abs((bottom - top) - typical) <= typical * CARD_HEIGHT_TOLERANCE
+    ]
+    if len(cards) < CARD_MIN_COUNT:
+        # One band could just as well be a banner or the gap under the header.
+        return []
+    return [card_boxes(panel, top, bottom) for top, bottom in cards]
+
+
+def card_boxes(panel: tuple[int, int, int, int], top: int, bottom: int) -> dict[str, tuple[int, int, int, int]]:
+    # Same text column as row_boxes, with the name and status bands placed at the same
+    # fractions of the card's height that the fixed layout uses.
+    height = max(1, panel[3] - panel[1])
+    y = (top - panel[1]) / height
+    card = (bottom - top) / height
+    return {
+        "name": relative_box(panel, 0.168, y + card * 0.09, 0.505, y + card * 0.575),
+        "status": relative_box(panel, 0.168, y + card * 0.42, 0.455, y + card * 0.90),
+        "full": relative_box(panel, 0.160, y, 0.520, y + card),
+    }
+
+
 def row_boxes(panel: tuple[int, int, int, int]) -> list[dict[str, tuple[int, int, int, int]]]:
     # Rows are stable relative to the panel even when the right-side cells differ.
     # Crops are deliberately text-column-only: portraits and item boxes cause OCR noise.
@@ -127,101 +814,443 @@ def row_boxes(panel: tuple[int, int, int, int]) -> list[dict[str, tuple[int, int
     return rows
 
 
-def parse_row(image: Image.Image, boxes: dict[str, tuple[int, int, int, int]], row_index: int) -> RowDebug:
-    full_box = boxes["full"]
-    name_box = boxes["name"]
-    status_box = boxes["status"]
+@dataclass
+class RowWork:
+    # In-progress state of one row while the scan's passes run over it.
+    index: int
+    image: Image.Image
+    image_index: int
+    boxes: dict[str, tuple[int, int, int, int]]
+    fingerprint: str = ""
+    name_print: str = ""
+    raw_parts: list[str] = field(default_factory=list)
+    all_lines: list[str] = field(default_factory=list)
+    reserved: bool = False
+    name: Optional[str] = None
+    name_tried: bool = False
+    complete: bool = True
+    # Set once the row's outcome is known and no further passes are useful.
+    settled: bool = False
+    # Tight box around the located text lines; the full passes OCR this instead of boxes["full"].
+    text_box: Optional[tuple[int, int, int, int]] = None
+    # Upscale cap for every pass on this row; None leaves each pass's own scale.
+    max_scale: Optional[float] = None
+    # Whether the full pass may fall back to a binary read, and whether that read starts
+    # alongside the gray one instead of after it.
+    binary_fallback: bool = True
+    speculative: bool = False
+
+    def scale(self, wanted: float) -> float:
+        return wanted if self.max_scale is None else min(wanted, self.max_scale)
+
+    def finish(self) -> RowDebug:
+        # If name still fails, try the whole crop but prefer a line above a reserved-looking line.
+        if self.reserved and not self.name:
+            self.name = extract_best_name(self.all_lines)
+        if self.name:
+            self.name = lookup_alias(self.name) or self.name
+
+        debug_lines = unique_keep_order(clean_ocr_lines("\n".join(self.all_lines)))
+        return RowDebug(
+            row=self.index,
+            raw_text="\n".join([part for part in self.raw_parts if part.strip()]),
+            cleaned_lines=debug_lines,
+            reserved=self.reserved,
+            name=self.name,
+            box=self.boxes["full"],
+            image=self.image_index,
+            fingerprint=self.fingerprint,
+            name_print=self.name_print,
+            complete=self.complete,
+        )
 
-    raw_parts = []
-    all_lines = []
 
-    # Primary pass: OCR the combined name and status region so line order can be used.
-    full_lines = ocr_lines(image, full_box, psm=6, scale=4, mode="gray")
-    raw_parts.append("FULL_GRAY: " + join_lines(full_lines))
-    all_lines.extend(full_lines)
+async def run_row_passes(works: list[RowWork], deadline: Optional[float] = None) -> None:
+    # Breadth first: every row gets the cheap primary pass before any row gets a fallback,
+    # so when the deadline hits, the time has gone to the passes most likely to pay off.
+    # Rows are independent, so each stage runs them together within the scan's OCR slots.
+    # A read that cannot start or finish before the deadline raises TimeoutError, which
+    # ends that row's pass and marks the row incomplete.
+    async def run_guarded(run_pass, work: RowWork) -> None:
+        try:
+            await run_pass(work, deadline)
+        except TimeoutError:
+            work.complete = False
+
+    for needed, run_pass in ROW_PASSES:
+        ready = []
+        for work in works:
+            if not needed(work):
+                continue
+            if time_left(deadline) < MIN_PASS_TIME:
+                work.complete = False
+                continue
+            ready.append(work)
+        await asyncio.gather(*(run_guarded(run_pass, work) for work in ready))
+
+
+async def pass_localized(work: RowWork, deadline: Optional[float]) -> None:
+    # First pass: find the name and status lines by geometry and OCR each tight line box,
+    # so most of the row's empty background never reaches Tesseract.
+    lines = locate_text_lines(work.image, work.boxes["full"])
+    if not lines:
+        return
+    work.text_box = union_box(lines)
+    if len(lines) < 2:
+        return
+
+    name_box, status_box = lines[0], lines[1]
+    status_lines = await ocr_lines(
+        work.image,
+        status_box,
+        psm=7,
+        scale=work.scale(5),
+        mode="adaptive",
+        whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZ.",
+        kind="status",
+        deadline=deadline,
+    )
+    work.raw_parts.append("LINE_STATUS: " + join_lines(status_lines))
+    work.all_lines.extend(status_lines)
+    work.reserved = lines_have_reserved(status_lines)
+    if not work.reserved:
+        # A cleanly read other status (ASSIGNED, IN FIGHT, K.O.) settles the row as not reserved.
+        work.settled = lines_have_other_status(status_lines)
+        return
+
+    if time_left(deadline) < MIN_PASS_TIME:
+        work.complete = False
+        return
+    name_lines = await ocr_lines(work.image, name_box, psm=7, scale=work.scale(5), mode="gray", kind="name", deadline=deadline)
+    work.raw_parts.append("LINE_NAME: " + join_lines(name_lines))
+    work.all_lines.extend(name_lines)
+    work.name = alias_from_lines(name_lines) or extract_best_name(name_lines)
+    work.settled = bool(work.name)
+
+
+async def pass_full(work: RowWork, deadline: Optional[float]) -> None:
+    # Combined name and status region so line order can be used. Gray is read first;
+    # binary often reads RESERVED better and is the fallback. When an OCR slot is still
+    # free once this stage's gray reads have queued, the binary read starts alongside and
+    # is cancelled if the gray read settles the row; it never queues ahead of a gray read.
+    box = work.text_box or work.boxes["full"]
+
+    def read(mode: str) -> asyncio.Task:
+        return asyncio.create_task(ocr_lines(work.image, box, psm=6, scale=work.scale(4), mode=mode, deadline=deadline))
+
+    read_gray = read("gray")
+    read_binary = None
+    try:
+        if work.binary_fallback and work.speculative:
+            # One turn of the loop lets every row's gray read ask for a slot first.
+            await asyncio.sleep(0)
+            if spare_ocr_slot():
+                read_binary = read("binary")
+        full_lines = await read_gray
+        work.raw_parts.append("FULL_GRAY: " + join_lines(full_lines))
+        work.all_lines.extend(full_lines)
+        if not work.reserved:
+            work.reserved = lines_have_reserved(full_lines)
+        if not work.name:
+            work.name = alias_from_lines(full_lines) or name_from_reserved_context(full_lines)
+        if work.reserved and work.name:
+            work.settled = True
+        if work.settled or not work.binary_fallback:
+            return
+        if read_binary is None:
+            if time_left(deadline) < MIN_PASS_TIME:
+                work.complete = False
+                return
+            read_binary = read("binary")
+
+        full_lines_bin = await read_binary
+        work.raw_parts.append("FULL_BIN: " + join_lines(full_lines_bin))
+        work.all_lines.extend(full_lines_bin)
+        if not work.reserved:
+            work.reserved = lines_have_reserved(full_lines_bin)
+        if not work.name:
+            work.name = name_from_reserved_context(full_lines_bin)
+    finally:
+        pending = [task for task in (read_gray, read_binary) if task is not None and not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
 
-    reserved = lines_have_reserved(full_lines)
-    name = name_from_reserved_context(full_lines)
+def spare_ocr_slot() -> bool:
+    # True when a read could start now without waiting behind another one.
+    slots = _ocr_slots.get()
+    return slots is not None and not slots.locked()
 
-    # Second pass: binary often reads RESERVED better than grayscale.
-    if not reserved or not name:
-        full_lines_bin = ocr_lines(image, full_box, psm=6, scale=4, mode="binary")
-        raw_parts.append("FULL_BIN: " + join_lines(full_lines_bin))
-        all_lines.extend(full_lines_bin)
-        if not reserved:
-            reserved = lines_have_reserved(full_lines_bin)
-        if not name:
-            name = name_from_reserved_context(full_lines_bin)
 
+async def pass_status(work: RowWork, deadline: Optional[float]) -> None:
     # Status-only fallback: catches rows where the full crop smears the status word.
-    if not reserved:
-        status_lines = []
-        for threshold in [105, 125, 145, "auto"]:
-            lines = ocr_lines(
-                image,
-                status_box,
-                psm=7,
-                scale=5,
-                mode="binary",
-                threshold=threshold,
-                whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZ",
-            )
-            status_lines.extend(lines)
-        raw_parts.append("STATUS: " + join_lines(status_lines))
-        all_lines.extend(status_lines)
-        reserved = lines_have_reserved(status_lines)
+    # One locally thresholded image replaces the old sweep over global thresholds.
+    status_lines = await ocr_lines(
+        work.image,
+        work.boxes["status"],
+        psm=7,
+        scale=work.scale(5),
+        mode="adaptive",
+        whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+        kind="status",
+        deadline=deadline,
+    )
+    work.raw_parts.append("STATUS: " + join_lines(status_lines))
+    work.all_lines.extend(status_lines)
+    work.reserved = lines_have_reserved(status_lines)
 
+
+async def pass_name(work: RowWork, deadline: Optional[float]) -> None:
     # Name-only fallback. Run only when the row is known or strongly suspected to be reserved.
-    if reserved and not name:
-        name_lines = []
-        for mode in ["gray", "binary", "soft"]:
-            lines = ocr_lines(image, name_box, psm=7, scale=5, mode=mode)
-            name_lines.extend(lines)
-            name = extract_best_name(lines)
-            if name:
-                break
-        raw_parts.append("NAME: " + join_lines(name_lines))
-        all_lines.extend(name_lines)
-
-    # If name still fails, try the whole crop but prefer a line above a reserved-looking line.
-    if reserved and not name:
-        name = extract_best_name(all_lines)
-
-    debug_lines = unique_keep_order(clean_ocr_lines("\n".join(all_lines)))
-    return RowDebug(
-        row=row_index,
-        raw_text="\n".join([part for part in raw_parts if part.strip()]),
-        cleaned_lines=debug_lines,
-        reserved=reserved,
-        name=name,
-        box=full_box,
+    work.name_tried = True
+    name_lines = []
+    for mode in ["gray", "adaptive"]:
+        if time_left(deadline) < MIN_PASS_TIME:
+            work.complete = False
+            break
+        lines = await ocr_lines(work.image, work.boxes["name"], psm=7, scale=work.scale(5), mode=mode, kind="name", deadline=deadline)
+        name_lines.extend(lines)
+        work.name = extract_best_name(lines)
+        if work.name:
+            break
+    work.raw_parts.append("NAME: " + join_lines(name_lines))
+    work.all_lines.extend(name_lines)
+
+
+def needs_name(work: RowWork) -> bool:
+    return work.reserved and not work.name and not work.name_tried and not work.settled
+
+
+# (needed, pass) in priority order. The name pass appears twice so rows that only turn
+# out reserved in the status sweep still get one, after every known-reserved row has.
+ROW_PASSES = [
+    (lambda work: True, pass_localized),
+    (lambda work: not work.settled and (not work.reserved or not work.name), pass_full),
+    (needs_name, pass_name),
+    (lambda work: not work.settled and not work.reserved, pass_status),
+    (needs_name, pass_name),
+]
+
+
+def set_aliases(aliases: dict[str, dict]) -> None:
+    global _aliases
+    _aliases = {key: entry["name"] for key, entry in aliases.items() if entry.get("name")}
+
+
+def lookup_alias(text: str) -> Optional[str]:
+    return _aliases.get(cleanup_name(text).casefold())
+
+
+def alias_from_lines(lines: list[str]) -> Optional[str]:
+    # A known mis-read resolves the name straight away, without the name-only fallbacks.
+    if not _aliases:
+        return None
+    for line in lines:
+        found = lookup_alias(line) or lookup_alias(remove_status_text(line))
+        if found:
+            return found
+    return None
+
+
+def alias_pairs(read_names: list[str], confirmed_names: list[str]) -> list[tuple[str, str]]:
+    # Pairs each OCR name the officer replaced with the most similar name they typed instead.
+    confirmed_keys = {name.casefold() for name in confirmed_names}
+    read_keys = {name.casefold() for name in read_names}
+    replaced = [name for name in read_names if name.casefold() not in confirmed_keys]
+    added = [name for name in confirmed_names if name.casefold() not in read_keys]
+
+    pairs = []
+    for read in replaced:
+        if not added:
+            break
+        best = max(added, key=lambda name: SequenceMatcher(None, read.casefold(), name.casefold()).ratio())
+        if SequenceMatcher(None, read.casefold(), best.casefold()).ratio() >= ALIAS_MIN_RATIO:
+            pairs.append((read, best))
+            added.remove(best)
+    return pairs
+
+
+def locate_text_lines(image: Image.Image, box: tuple[int, int, int, int]) -> list[tuple[int, int, int, int]]:
+    # Projection profiles on a locally binarised, unscaled copy of the crop: row sums
+    # split it into text lines, column sums give each line's horizontal extent.
+    box = clamp_box(box, image.size)
+    gray = ImageOps.autocontrast(image.crop(box).convert("L"), cutoff=1)
+    if gray.width < 8 or gray.height < 8:
+        return []
+    mask = ImageOps.invert(adaptive_binarize(gray))
+    row_profile = list(mask.resize((1, mask.height), Image.Resampling.BOX).getdata())
+
+    bands = []
+    start = None
+    for y, value in enumerate(row_profile + [0]):
+        if value > 255 * 0.015 and start is None:
+            start = y
+        elif value <= 255 * 0.015 and start is not None:
+            if bands and start - bands[-1][1] <= 2:
+                # Rejoin accents and descenders split off by a one-pixel gap.
+                bands[-1] = (bands[-1][0], y)
+            else:
+                bands.append((start, y))
+            start = None
+    tallest = max((bottom - top for top, bottom in bands), default=0)
+    bands = [(top, bottom) for top, bottom in bands if bottom - top >= max(4, tallest * 0.35)]
+
+    lines = []
+    for top, bottom in bands:
+        strip = mask.crop((0, top, mask.width, bottom))
+        columns = list(strip.resize((strip.width, 1), Image.Resampling.BOX).getdata())
+        filled = [x for x, value in enumerate(columns) if value > 0]
+        if not filled:
+            continue
+        pad = max(3, (bottom - top) // 3)
+        lines.append((
+            box[0] + max(0, filled[0] - pad),
+            box[1] + max(0, top - pad),
+            box[0] + min(mask.width, filled[-1] + 1 + pad),
+            box[1] + min(mask.height, bottom + pad),
+        ))
+    return lines
+
+
+def union_box(boxes: list[tuple[int, int, int, int]]) -> tuple[int, int, int, int]:
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes),
     )
 
 
-def ocr_text(
+async def ocr_text(
     image: Image.Image,
     box: tuple[int, int, int, int],
     psm: int,
-    scale: int,
+    scale: float,
     mode: str,
     threshold="auto",
     whitelist: Optional[str] = None,
+    kind: str = "full",
+    deadline: Optional[float] = None,
 ) -> str:
     crop = image.crop(clamp_box(box, image.size))
+    # `scale` is the upper bound; crops whose text is already tall enough get less.
+    scale = adaptive_scale(crop, scale)
     prepared = prep_text_crop(crop, scale=scale, mode=mode, threshold=threshold)
-    return run_tesseract(prepared, psm=psm, whitelist=whitelist)
+    crop.close()
+    if mode in {"binary", "adaptive"}:
+        # Already two-level; as 1-bit it goes over stdin as PBM, an eighth of the bytes.
+        prepared = prepared.convert("1", dither=Image.Dither.NONE)
+    dpi = int(SOURCE_DPI * scale)
+    extra_args = tesseract_profile(kind)
+    try:
+        if OCR_BACKEND == "replay":
+            return replay_ocr_call(ocr_call_key(prepared, psm, whitelist, kind, dpi, extra_args))
+        async with _ocr_slots.get() or contextlib.nullcontext():
+            # The timeout is taken only once a slot is free, so queueing counts against the deadline.
+            timeout = time_left(deadline)
+            if timeout < MIN_PASS_TIME:
+                raise TimeoutError("scan deadline reached before this read could start")
+            text = await run_tesseract(
+                prepared,
+                psm=psm,
+                whitelist=whitelist,
+                dpi=dpi,
+                extra_args=extra_args,
+                timeout=timeout,
+            )
+        if OCR_BACKEND == "record":
+            record_ocr_call(ocr_call_key(prepared, psm, whitelist, kind, dpi, extra_args), kind, mode, text)
+        return text
+    finally:
+        prepared.close()
+
 
+def set_ocr_backend(backend: str, fixtures: Optional[str] = None) -> None:
+    global OCR_BACKEND, OCR_FIXTURES, _replay, replay_misses
+    OCR_BACKEND = backend
+    if fixtures:
+        OCR_FIXTURES = fixtures
+    _replay = None
+    replay_misses = 0
+
+
+def ocr_call_key(
+    prepared: Image.Image,
+    psm: int,
+    whitelist: Optional[str],
+    kind: str,
+    dpi: Optional[int] = None,
+    extra_args: Optional[list[str]] = None,
+) -> str:
+    # Identical crop pixels and Tesseract settings always give the same text.
+    digest = hashlib.blake2b(prepared.tobytes(), digest_size=12)
+    digest.update(f"{prepared.mode}|{prepared.size}|{psm}|{whitelist or ''}|{kind}|{dpi or ''}".encode("utf-8"))
+    for arg in extra_args or []:
+        # Word and pattern files are keyed by name and content, not by where they live,
+        # so fixtures recorded on one machine replay on another.
+        if os.path.isfile(arg):
+            digest.update(os.path.basename(arg).encode("utf-8"))
+            with open(arg, "rb") as file:
+                digest.update(file.read())
+        else:
+            digest.update(arg.encode("utf-8"))
+        digest.update(b"|")
+    return digest.hexdigest()
 
-def ocr_lines(
+
+def record_ocr_call(key: str, kind: str, mode: str, text: str) -> None:
+    # One short JSON line per call; appends from several workers do not interleave.
+    line = json.dumps({"key": key, "kind": kind, "mode": mode, "text": text}, ensure_ascii=False)
+    with open(OCR_FIXTURES, "a", encoding="utf-8") as file:
+        file.write(line + "\n")
+
+
+def load_ocr_fixtures(path: str) -> list[dict]:
+    calls = []
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    calls.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except OSError:
+        pass
+    return [call for call in calls if isinstance(call, dict) and "key" in call and "text" in call]
+
+
+def replay_ocr_call(key: str) -> str:
+    global _replay, replay_misses
+    if _replay is None:
+        _replay = {call["key"]: call["text"] for call in load_ocr_fixtures(OCR_FIXTURES)}
+    if key not in _replay:
+        replay_misses += 1
+    return _replay.get(key, "")
+
+
+async def ocr_lines(
     image: Image.Image,
     box: tuple[int, int, int, int],
     psm: int,
-    scale: int,
+    scale: float,
     mode: str,
     threshold="auto",
     whitelist: Optional[str] = None,
+    kind: str = "full",
+    deadline: Optional[float] = None,
 ) -> list[str]:
-    text = ocr_text(image, box, psm=psm, scale=scale, mode=mode, threshold=threshold, whitelist=whitelist)
+    text = await ocr_text(
+        image,
+        box,
+        psm=psm,
+        scale=scale,
+        mode=mode,
+        threshold=threshold,
+        whitelist=whitelist,
+        kind=kind,
+        deadline=deadline,
+    )
     return clean_ocr_lines(text)
 
 
@@ -231,14 +1260,52 @@ def clamp_box(box: tuple[int, int, int, int], size: tuple[int, int]) -> tuple[in
     return (max(0, x1), max(0, y1), min(w, x2), min(h, y2))
 
 
-def prep_text_crop(crop: Image.Image, scale: int, mode: str, threshold="auto") -> Image.Image:
+def estimate_text_height(crop: Image.Image) -> Optional[int]:
+    # Horizontal projection profile: rows holding light glyph pixels form one run per text line.
+    gray = ImageOps.autocontrast(crop.convert("L"), cutoff=1)
+    if gray.width < 4 or gray.height < 4:
+        return None
+    threshold = max(92, min(170, int(ImageStat.Stat(gray).mean[0] + 28)))
+    mask = gray.point(lambda p: 255 if p > threshold else 0)
+    # Squash to one column: each output pixel is the share of text pixels in that row.
+    profile = list(mask.resize((1, gray.height), Image.Resampling.BOX).getdata())
+    min_fill = 255 * 0.02
+
+    runs = []
+    start = None
+    for y, value in enumerate(profile + [0]):
+        if value > min_fill and start is None:
+            start = y
+        elif value <= min_fill and start is not None:
+            if y - start >= 3:
+                runs.append(y - start)
+            start = None
+    if not runs:
+        return None
+    runs.sort()
+    return runs[len(runs) // 2]
+
+
+def adaptive_scale(crop: Image.Image, max_scale: float) -> float:
+    if max_scale <= 1:
+        return 1.0
+    height = estimate_text_height(crop)
+    if not height:
+        return float(max_scale)
+    # Quarter steps keep resize sizes stable between similar crops.
+    scale = round(TARGET_TEXT_HEIGHT / height * 4) / 4
+    return max(1.0, min(float(max_scale), scale))
+
+
+def prep_text_crop(crop: Image.Image, scale: float, mode: str, threshold="auto") -> Image.Image:
     gray = crop.convert("L")
     gray = ImageOps.autocontrast(gray, cutoff=1)
     gray = ImageEnhance.Contrast(gray).enhance(2.2)
     gray = gray.filter(ImageFilter.SHARPEN)
 
     if scale > 1:
-        gray = gray.resize((gray.width * scale, gray.height * scale), Image.Resampling.LANCZOS)
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.Resampling.LANCZOS)
 
     if mode == "gray":
         return ImageOps.invert(gray)
@@ -248,6 +1315,9 @@ def prep_text_crop(crop: Image.Image, scale: int, mode: str, threshold="auto") -
         soft = ImageEnhance.Contrast(soft).enhance(1.4)
         return soft
 
+    if mode == "adaptive":
+        return adaptive_binarize(gray)
+
     if threshold == "auto":
         stat = ImageStat.Stat(gray)
         mean = stat.mean[0]
@@ -257,17 +1327,96 @@ def prep_text_crop(crop: Image.Image, scale: int, mode: str, threshold="auto") -
     return gray.point(lambda p: 0 if p > int(threshold) else 255)
 
 
-def run_tesseract(image: Image.Image, psm: int, whitelist: Optional[str] = None) -> str:
+def set_roster(names: list[str]) -> None:
+    # Regenerates the name word lists only when the saved roster actually changed.
+    global _roster_digest
+    words = sorted({word for name in names for word in name.split() if word}, key=str.casefold)
+    digest = hashlib.sha1("\n".join(words).encode("utf-8")).hexdigest()
+    if digest == _roster_digest:
+        return
+    digest_path = os.path.join(TESSERACT_PROFILE_DIR, "roster.sha1")
+    try:
+        os.makedirs(TESSERACT_PROFILE_DIR, exist_ok=True)
+        stored = ""
+        if os.path.exists(digest_path):
+            with open(digest_path, "r", encoding="utf-8") as file:
+                stored = file.read().strip()
+        if stored != digest or not os.path.exists(os.path.join(TESSERACT_PROFILE_DIR, "full.user-words")):
+            write_profile_file("name.user-words", words)
+            write_profile_file("full.user-words", words + STATUS_VOCABULARY)
+            write_profile_file("roster.sha1", [digest])
+    except OSError:
+        return
+    _roster_digest = digest
+    _profile_args.pop("name", None)
+    _profile_args.pop("full", None)
+
+
+def write_profile_file(filename: str, lines: list[str]) -> None:
+    path = os.path.join(TESSERACT_PROFILE_DIR, filename)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def tesseract_profile(kind: str) -> list[str]:
+    if kind in _profile_args:
+        return _profile_args[kind]
+
+    args = list(NO_DICTIONARY_ARGS)
+    try:
+        os.makedirs(TESSERACT_PROFILE_DIR, exist_ok=True)
+        if kind == "header":
+            write_profile_file("header.user-words", HEADER_WORDS)
+            write_profile_file("header.user-patterns", HEADER_PATTERNS)
+            args.extend(["--user-patterns", os.path.join(TESSERACT_PROFILE_DIR, "header.user-patterns")])
+        elif kind == "status":
+            write_profile_file("status.user-words", STATUS_VOCABULARY)
+        words_path = os.path.join(TESSERACT_PROFILE_DIR, f"{kind}.user-words")
+        # An empty word list makes Tesseract fail to build the user dictionary.
+        if os.path.exists(words_path) and os.path.getsize(words_path) > 1:
+            args.extend(["--user-words", words_path])
+    except OSError:
+        pass
+
+    _profile_args[kind] = args
+    return args
+
+
+def adaptive_binarize(gray: Image.Image) -> Image.Image:
+    # Local-mean (Bradley/Niblack style) threshold. BoxBlur is a running-sum filter, the
+    # same window mean an integral image gives, and it runs in C on the whole crop.
+    radius = max(8, gray.height // 2)
+    local_mean = gray.filter(ImageFilter.BoxBlur(radius))
+    brighter = ImageChops.subtract(gray, local_mean)
+    local_text = brighter.point(lambda p: 255 if p > ADAPTIVE_OFFSET else 0)
+    # Ignore faint ripples in dark areas: text must also beat the crop's overall mean.
+    floor = int(ImageStat.Stat(gray).mean[0])
+    global_text = gray.point(lambda p: 255 if p > floor else 0)
+    text = ImageChops.darker(local_text, global_text)
+    # Game text is light on a dark background. Tesseract prefers black text on white.
+    return ImageOps.invert(text)
+
+
+async def run_tesseract(
+    image: Image.Image,
+    psm: int,
+    whitelist: Optional[str] = None,
+    dpi: Optional[int] = None,
+    extra_args: Optional[list[str]] = None,
+    timeout: float = TESSERACT_TIMEOUT,
+) -> str:
     env = os.environ.copy()
     env["OMP_THREAD_LIMIT"] = "1"
 
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as img_file:
-        image.save(img_file.name, optimize=False)
-        image_path = img_file.name
+    # Uncompressed PGM/PBM on stdin: no PNG encode and no temp file to clean up.
+    buffer = io.BytesIO()
+    image.save(buffer, "PPM")
 
     cmd = [
         "tesseract",
-        image_path,
+        "stdin",
         "stdout",
         "--oem",
         "1",
@@ -276,25 +1425,29 @@ def run_tesseract(image: Image.Image, psm: int, whitelist: Optional[str] = None)
         "-l",
         "eng",
     ]
+    if dpi:
+        cmd.extend(["--dpi", str(max(70, min(2400, dpi)))])
+    if extra_args:
+        cmd.extend(extra_args)
     if whitelist:
         cmd.extend(["-c", "tessedit_char_whitelist=" + whitelist])
 
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=env,
+    )
     try:
-        completed = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=5,
-            env=env,
-        )
-        return completed.stdout.strip()
-    except subprocess.TimeoutExpired:
-        return ""
+        # A timeout propagates as TimeoutError so the caller can tell it from an empty read.
+        stdout, _ = await asyncio.wait_for(process.communicate(buffer.getvalue()), timeout=max(0.1, timeout))
     finally:
-        try:
-            os.remove(image_path)
-        except OSError:
-            pass
+        # Also reached when a speculative pass is cancelled: the CPU goes back straight away.
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    return stdout.decode("utf-8", errors="replace").strip()
 
 
 def extract_battlegroup(text: str) -> Optional[int]:
@@ -356,6 +1509,12 @@ def lines_have_reserved(lines: list[str]) -> bool:
     return False
 
 
+def lines_have_other_status(lines: list[str]) -> bool:
+    # Only a line that reads as nothing but another status word counts; "KO" inside a
+    # name, or a line that may still hold part of the name, must not settle the row.
+    return any(OTHER_STATUS_LINE.fullmatch(line.strip().upper()) for line in lines)
+
+
 def looks_like_reserved(line: str) -> bool:
     cleaned = re.sub(r"[^A-Za-z]", "", line).upper()
     if not cleaned:
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import traceback
+from contextlib import closing
+from typing import Optional
+
+from memory import rss_mb
+from ocr_parser import (
+    parse_battlegroup_images,
+    scan_result_from_dict,
+    scan_result_to_dict,
+    set_aliases,
+    set_header_templates,
+    set_roster,
+)
+from storage import DATA_DIR, ensure_data_dir, load_aliases, load_data, load_header_templates
+
+# OCR runs in worker processes fed from a SQLite queue, so a memory spike or a hung
+# Tesseract run only takes down a worker and never the Discord gateway.
+QUEUE_FILE = os.path.join(DATA_DIR, "ocr_jobs.sqlite3")
+WORKER_MAX_JOBS = int(os.getenv("OCR_WORKER_MAX_JOBS", "40"))
+WORKER_MAX_RSS_MB = int(os.getenv("OCR_WORKER_MAX_RSS_MB", "300"))
+# A running job whose worker has not finished it in this long is handed to another worker.
+# Scans stop OCR at their budget (30 s by default), so this only catches a hung worker;
+# one that dies is noticed by the supervisor and its job is requeued straight away.
+JOB_LEASE_SECONDS = float(os.getenv("OCR_JOB_LEASE", "45"))
+JOB_MAX_ATTEMPTS = 2
+POLL_INTERVAL = 0.2
+# Live worker processes, for memory accounting in the bot.
+worker_pids: set[int] = set()
+# Queue files whose schema this process has already applied.
+_schema_ready: set[str] = set()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    options TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    claimed_at REAL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_images (
+    job_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+
+def connect(check_same_thread: bool = True) -> sqlite3.Connection:
+    ensure_data_dir()
+    conn = sqlite3.connect(QUEUE_FILE, timeout=30, isolation_level=None, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if QUEUE_FILE not in _schema_ready:
+        # WAL mode is stored in the file, so both only need doing once per process.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _schema_ready.add(QUEUE_FILE)
+    return conn
+
+
+def submit_job(images: list[bytes], options: dict) -> int:
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute(
+            "INSERT INTO jobs (options, created_at) VALUES (?, ?)",
+            (json.dumps(options), time.time()),
+        )
+        job_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO job_images (job_id, position, data) VALUES (?, ?, ?)",
+            [(job_id, position, data) for position, data in enumerate(images)],
+        )
+        conn.execute("COMMIT")
+        return job_id
+
+
+def claim_job(pid: int) -> Optional[tuple[int, list[bytes], dict]]:
+    # Only queued jobs. A job whose lease ran out stays with its worker until the
+    # supervisor has killed that worker and released the job with release_jobs.
+    now = time.time()
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT id, options FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        job_id, options = row
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker_pid = ?, claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+            (pid, now, job_id),
+        )
+        images = [
+            data for (data,) in conn.execute(
+                "SELECT data FROM job_images WHERE job_id = ? ORDER BY position", (job_id,)
+            )
+        ]
+        conn.execute("COMMIT")
+        return job_id, images, json.loads(options)
+
+
+def finish_job(job_id: int, pid: int, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+    # Ignored unless this worker still holds the job, so a worker that lost its lease
+    # cannot overwrite the result of the retry.
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        updated = conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ? WHERE id = ? AND worker_pid = ? AND status = 'running'",
+            ("done" if error is None else "failed", json.dumps(result) if result is not None else None, error, job_id, pid),
+        ).rowcount
+        if updated:
+            conn.execute("DELETE FROM job_images WHERE job_id = ?", (job_id,))
+        conn.execute("COMMIT")
+
+
+def take_result(conn: sqlite3.Connection, job_id: int) -> Optional[tuple[str, Optional[dict], Optional[str]]]:
+    # Returns (status, result, error) once the job is finished and removes it from the queue.
+    row = conn.execute("SELECT status, result, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return ("failed", None, "OCR job disappeared from the queue")
+    status, result, error = row
+    if status not in {"done", "failed"}:
+        return None
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+    conn.execute("DELETE FROM job_images WHERE job_id = ?", (job_id,))
+    conn.execute("COMMIT")
+    return status, json.loads(result) if result else None, error
+
+
+def release_jobs(pids: set[int]) -> None:
+    # Jobs held by workers that exited go back to the queue, or fail once out of attempts.
+    if not pids:
+        return
+    marks = ", ".join("?" for _ in pids)
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'OCR worker stopped responding' "
+            f"WHERE status = 'running' AND attempts >= ? AND worker_pid IN ({marks})",
+            (JOB_MAX_ATTEMPTS, *pids),
+        )
+        conn.execute(
+            f"UPDATE jobs SET status = 'queued', worker_pid = NULL WHERE status = 'running' AND worker_pid IN ({marks})",
+            tuple(pids),
+        )
+        conn.execute("COMMIT")
+
+
+def purge_stale_jobs(max_age: float = 600) -> None:
+    # Nobody is waiting for jobs left over from before a bot restart.
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cutoff = time.time() - max_age
+        conn.execute("DELETE FROM job_images WHERE job_id IN (SELECT id FROM jobs WHERE created_at < ?)", (cutoff,))
+        conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,))
+        conn.execute("COMMIT")
+
+
+def expired_worker_pids() -> set[int]:
+    with closing(connect()) as conn:
+        rows = conn.execute(
+            "SELECT worker_pid FROM jobs WHERE status = 'running' AND claimed_at < ?",
+            (time.time() - JOB_LEASE_SECONDS,),
+        ).fetchall()
+    return {pid for (pid,) in rows if pid}
+
+
+async def run_scan_job(
+    images: list[bytes],
+    battlegroup_override: Optional[int],
+    previous: dict,
+    budget: float,
+    layouts: Optional[dict] = None,
+    battlegroup_hint: Optional[int] = None,
+    low_memory: bool = False,
+    ocr_slots: Optional[int] = None,
+):
+    options = {
+        "battlegroup_override": battlegroup_override,
+        "previous": {str(bg): scan_result_to_dict(result) for bg, result in previous.items()},
+        "budget": budget,
+        "layouts": layouts or {},
+        "battlegroup_hint": battlegroup_hint,
+        "low_memory": low_memory,
+        "ocr_slots": ocr_slots,
+    }
+    job_id = await asyncio.to_thread(submit_job, images, options)
+    give_up = time.monotonic() + budget + JOB_LEASE_SECONDS * JOB_MAX_ATTEMPTS
+    # One connection for the whole wait; the polls run one at a time on worker threads.
+    conn = await asyncio.to_thread(connect, False)
+    try:
+        while time.monotonic() < give_up:
+            await asyncio.sleep(POLL_INTERVAL)
+            finished = await asyncio.to_thread(take_result, conn, job_id)
+            if finished is None:
+                continue
+            status, result, error = finished
+            if status == "done" and result is not None:
+                return scan_result_from_dict(result)
+            raise RuntimeError(error or "OCR job failed")
+    finally:
+        conn.close()
+    raise TimeoutError("OCR workers did not finish the scan in time")
+
+
+def process_job(images: list[bytes], options: dict) -> dict:
+    set_roster([name for names in load_data().get("battlegroups", {}).values() for name in names])
+    set_aliases(load_aliases())
+    set_header_templates(load_header_templates())
+    previous = {
+        int(bg): scan_result_from_dict(result)
+        for bg, result in (options.get("previous") or {}).items()
+    }
+    result = parse_battlegroup_images(
+        images,
+        options.get("battlegroup_override"),
+        previous,
+        options.get("budget"),
+        layouts=options.get("layouts"),
+        battlegroup_hint=options.get("battlegroup_hint"),
+        low_memory=bool(options.get("low_memory")),
+        ocr_slots=options.get("ocr_slots"),
+    )
+    return scan_result_to_dict(result)
+
+
+def work(max_jobs: int = WORKER_MAX_JOBS, max_rss_mb: int = WORKER_MAX_RSS_MB) -> None:
+    # Exits after max_jobs or once RSS passes the limit; the supervisor starts a fresh worker.
+    pid = os.getpid()
+    parent = os.getppid()
+    handled = 0
+    while handled < max_jobs and rss_mb() < max_rss_mb:
+        if os.getppid() != parent:
+            # The bot is gone; nobody will collect results.
+            break
+        job = claim_job(pid)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        job_id, images, options = job
+        try:
+            finish_job(job_id, pid, result=process_job(images, options))
+        except Exception as error:
+            print(traceback.format_exc(), file=sys.stderr)
+            finish_job(job_id, pid, error=f"{type(error).__name__}: {error}")
+        handled += 1
+
+
+async def supervise(count: int) -> None:
+    # Keeps `count` worker processes alive and kills any that hold an expired lease.
+    await asyncio.to_thread(purge_stale_jobs)
+    script = os.path.abspath(__file__)
+    workers: list[subprocess.Popen] = []
+    try:
+        while True:
+            exited = {proc.pid for proc in workers if proc.poll() is not None}
+            await asyncio.to_thread(release_jobs, exited)
+            workers = [proc for proc in workers if proc.pid not in exited]
+            while len(workers) < count:
+                workers.append(subprocess.Popen([sys.executable, script]))
+            worker_pids.clear()
+            worker_pids.update(proc.pid for proc in workers)
+            hung = await asyncio.to_thread(expired_worker_pids)
+            for proc in workers:
+                if proc.pid in hung:
+                    proc.kill()
+            await asyncio.sleep(1)
+    finally:
+        for proc in workers:
+            proc.terminate()
+        worker_pids.clear()
+
+
+if __name__ == "__main__":
+    work()
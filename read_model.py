@@ -0,0 +1,80 @@
+import json
+from copy import deepcopy
+from typing import Any, Optional
+
+from storage import add_change_listener, load_data
+
+# Rendered output for the read-only commands, kept in memory. The file is read once;
+# after that storage writes tell us which battlegroups changed and only those are re-rendered.
+_snapshot: Optional[dict[str, Any]] = None
+_list_blocks: dict[str, str] = {}
+_view_blocks: dict[str, str] = {}
+_list_text: Optional[str] = None
+_export_bytes: Optional[bytes] = None
+
+
+def install() -> None:
+    add_change_listener(on_data_changed)
+
+
+def on_data_changed(data: dict[str, Any]) -> None:
+    global _snapshot, _list_text, _export_bytes
+    if _snapshot is None:
+        return
+    old_groups = _snapshot.get("battlegroups", {})
+    new_groups = data.get("battlegroups", {})
+    changed = {key for key in set(old_groups) | set(new_groups) if old_groups.get(key) != new_groups.get(key)}
+    for key in changed:
+        _list_blocks.pop(key, None)
+        _view_blocks.pop(key, None)
+    if changed or set(old_groups) != set(new_groups):
+        _list_text = None
+    if data != _snapshot:
+        _export_bytes = None
+    _snapshot = deepcopy(data)
+
+
+def snapshot() -> dict[str, Any]:
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = load_data()
+    return _snapshot
+
+
+def list_text() -> str:
+    global _list_text
+    if _list_text is not None:
+        return _list_text
+    groups = snapshot().get("battlegroups", {})
+    if not groups:
+        _list_text = "No reservations saved yet."
+        return _list_text
+
+    blocks = []
+    for bg_key in sorted(groups, key=lambda x: int(x) if str(x).isdigit() else 999):
+        if bg_key not in _list_blocks:
+            names = groups.get(bg_key, [])
+            lines = [f"BG{bg_key}: {len(names)} reserved"]
+            lines.extend(f"- {name}" for name in names)
+            _list_blocks[bg_key] = "\n".join(lines)
+        blocks.append(_list_blocks[bg_key])
+    _list_text = "\n\n".join(blocks).strip()
+    return _list_text
+
+
+def viewbg_text(bg: int) -> str:
+    bg_key = str(bg)
+    if bg_key not in _view_blocks:
+        names = snapshot().get("battlegroups", {}).get(bg_key, [])
+        if names:
+            _view_blocks[bg_key] = f"BG{bg}:\n" + "\n".join(f"- {n}" for n in names)
+        else:
+            _view_blocks[bg_key] = f"BG{bg}: no reserved players saved."
+    return _view_blocks[bg_key]
+
+
+def export_bytes() -> bytes:
+    global _export_bytes
+    if _export_bytes is None:
+        _export_bytes = json.dumps(snapshot(), indent=2, ensure_ascii=False).encode("utf-8")
+    return _export_bytes
@@ -1,16 +1,26 @@
 import json
 import os
+from contextlib import contextmanager
 from copy import deepcopy
-from typing import Any
+from typing import Any, Callable, Iterator
 
 DATA_DIR = os.getenv("DATA_DIR", "/data")
 RESERVATIONS_FILE = os.path.join(DATA_DIR, "reservations.json")
 CONFIG_FILE = os.path.join(DATA_DIR, "config.json")
+ALIASES_FILE = os.path.join(DATA_DIR, "ocr_aliases.json")
+LAYOUTS_FILE = os.path.join(DATA_DIR, "layouts.json")
+HEADER_TEMPLATES_FILE = os.path.join(DATA_DIR, "header_templates.json")
+# Least-used aliases are dropped beyond this many entries.
+MAX_ALIASES = 500
+MAX_HEADER_TEMPLATES = 6
 
 DEFAULT_DATA = {
     "battlegroups": {}
 }
 
+# Called with the new data after every reservations write.
+change_listeners: list[Callable[[dict[str, Any]], None]] = []
+
 DEFAULT_CONFIG = {
     "log_channel_id": None,
     "scan_channel_id": None
@@ -54,6 +64,12 @@ def load_data() -> dict[str, Any]:
 
 def save_data(data: dict[str, Any]) -> None:
     save_json(RESERVATIONS_FILE, data)
+    for listener in change_listeners:
+        listener(data)
+
+
+def add_change_listener(listener: Callable[[dict[str, Any]], None]) -> None:
+    change_listeners.append(listener)
 
 
 def load_config() -> dict[str, Any]:
@@ -67,64 +83,183 @@ def save_config(config: dict[str, Any]) -> None:
     save_json(CONFIG_FILE, config)
 
 
-def save_reservations(bg: int, names: list[str], replace: bool = False) -> dict[str, Any]:
-    data = load_data()
-    bg_key = str(bg)
-    current = data["battlegroups"].setdefault(bg_key, [])
+def load_aliases() -> dict[str, dict[str, Any]]:
+    # {ocr text casefolded: {"name": confirmed name, "hits": times learned}}
+    aliases = load_json(ALIASES_FILE, {"aliases": {}}).get("aliases", {})
+    return aliases if isinstance(aliases, dict) else {}
 
-    if replace:
-        data["battlegroups"][bg_key] = unique_keep_order(names)
-    else:
-        data["battlegroups"][bg_key] = unique_keep_order(current + names)
 
-    save_data(data)
-    return data
+def record_aliases(pairs: list[tuple[str, str]]) -> dict[str, dict[str, Any]]:
+    aliases = load_aliases()
+    for read, actual in pairs:
+        key = read.casefold()
+        entry = aliases.get(key)
+        if entry and entry.get("name") == actual:
+            entry["hits"] = int(entry.get("hits", 0)) + 1
+        else:
+            aliases[key] = {"name": actual, "hits": 1}
+    if len(aliases) > MAX_ALIASES:
+        keep = sorted(aliases.items(), key=lambda item: item[1].get("hits", 0), reverse=True)[:MAX_ALIASES]
+        aliases = dict(keep)
+    save_json(ALIASES_FILE, {"aliases": aliases})
+    return aliases
 
 
-def remove_player(name: str) -> bool:
-    data = load_data()
-    changed = False
-    target = name.casefold()
-    for bg_key, names in data.get("battlegroups", {}).items():
-        filtered = [n for n in names if n.casefold() != target]
-        if len(filtered) != len(names):
-            data["battlegroups"][bg_key] = filtered
+def load_layouts() -> dict[str, dict[str, Any]]:
+    # {"WxH" or "guild:WxH": {"panel": box, "rows": [{"name", "status", "full"}], "hits", "confirmed", "edited"}}
+    profiles = load_json(LAYOUTS_FILE, {"profiles": {}}).get("profiles", {})
+    return profiles if isinstance(profiles, dict) else {}
+
+
+def save_layouts(profiles: dict[str, dict[str, Any]]) -> None:
+    save_json(LAYOUTS_FILE, {"profiles": profiles})
+
+
+def record_layout(key: str, panel: list[int], rows: list[dict[str, Any]]) -> None:
+    # Only called for scans confirmed without edits, so the geometry is known to work.
+    profiles = load_layouts()
+    profile = profiles.setdefault(key, {"hits": 0, "confirmed": 0, "edited": 0})
+    profile["panel"] = list(panel)
+    profile["rows"] = [{name: list(box) for name, box in row.items()} for row in rows]
+    profile["confirmed"] = int(profile.get("confirmed", 0)) + 1
+    save_layouts(profiles)
+
+
+def count_layout_use(key: str, stat: str) -> None:
+    profiles = load_layouts()
+    if key in profiles:
+        profiles[key][stat] = int(profiles[key].get(stat, 0)) + 1
+        save_layouts(profiles)
+
+
+def reset_layout(key: str) -> bool:
+    profiles = load_layouts()
+    if key == "all":
+        save_layouts({})
+        return bool(profiles)
+    existed = profiles.pop(key, None) is not None
+    if existed:
+        save_layouts(profiles)
+    return existed
+
+
+def load_header_templates() -> dict[str, list[str]]:
+    # {"2": [digit glyph thumbnails, newest last]}
+    templates = load_json(HEADER_TEMPLATES_FILE, {"templates": {}}).get("templates", {})
+    return templates if isinstance(templates, dict) else {}
+
+
+def record_header_template(bg: int, glyph: str) -> dict[str, list[str]]:
+    templates = load_header_templates()
+    glyphs = [old for old in templates.get(str(bg), []) if old != glyph]
+    glyphs.append(glyph)
+    templates[str(bg)] = glyphs[-MAX_HEADER_TEMPLATES:]
+    save_json(HEADER_TEMPLATES_FILE, {"templates": templates})
+    return templates
+
+
+class Transaction:
+    """Mutations applied to one loaded snapshot of the reservations.
+
+    Nothing is written until the transaction() block exits without an error,
+    and then the whole file is replaced once.
+    """
+
+    def __init__(self, data: dict[str, Any]):
+        self.data = data
+        self.changed = False
+
+    @property
+    def groups(self) -> dict[str, list[str]]:
+        return self.data["battlegroups"]
+
+    def save_reservations(self, bg: int, names: list[str], replace: bool = False) -> None:
+        bg_key = str(bg)
+        current = self.groups.setdefault(bg_key, [])
+        if replace:
+            self.groups[bg_key] = unique_keep_order(names)
+        else:
+            self.groups[bg_key] = unique_keep_order(current + names)
+        self.changed = True
+
+    def remove_player(self, name: str) -> bool:
+        changed = False
+        target = name.casefold()
+        for bg_key, names in self.groups.items():
+            filtered = [n for n in names if n.casefold() != target]
+            if len(filtered) != len(names):
+                self.groups[bg_key] = filtered
+                changed = True
+        self.changed = self.changed or changed
+        return changed
+
+    def rename_player(self, old: str, new: str) -> bool:
+        changed = False
+        old_key = old.casefold()
+        for bg_key, names in self.groups.items():
+            if not any(name.casefold() == old_key for name in names):
+                continue
+            updated = [new if name.casefold() == old_key else name for name in names]
+            self.groups[bg_key] = unique_keep_order(updated)
             changed = True
-    if changed:
-        save_data(data)
-    return changed
+        self.changed = self.changed or changed
+        return changed
+
+    def move_player(self, name: str, bg: int) -> bool:
+        # Keeps the saved spelling when the player already exists somewhere.
+        target = name.casefold()
+        saved = next((n for names in self.groups.values() for n in names if n.casefold() == target), None)
+        if saved is None:
+            return False
+        self.remove_player(saved)
+        self.save_reservations(bg, [saved])
+        return True
+
+    def clear_bg(self, bg: int) -> bool:
+        bg_key = str(bg)
+        existed = bg_key in self.groups
+        if existed:
+            self.groups[bg_key] = []
+            self.changed = True
+        return existed
+
+    def wipe(self) -> None:
+        self.data = deepcopy(DEFAULT_DATA)
+        self.changed = True
+
+
+@contextmanager
+def transaction() -> Iterator[Transaction]:
+    txn = Transaction(load_data())
+    yield txn
+    if txn.changed:
+        save_data(txn.data)
+
+
+def save_reservations(bg: int, names: list[str], replace: bool = False) -> dict[str, Any]:
+    with transaction() as txn:
+        txn.save_reservations(bg, names, replace=replace)
+    return txn.data
+
+
+def remove_player(name: str) -> bool:
+    with transaction() as txn:
+        return txn.remove_player(name)
 
 
 def rename_player(old: str, new: str) -> bool:
-    data = load_data()
-    changed = False
-    old_key = old.casefold()
-    for bg_key, names in data.get("battlegroups", {}).items():
-        updated = []
-        for name in names:
-            if name.casefold() == old_key:
-                updated.append(new)
-                changed = True
-            else:
-                updated.append(name)
-        data["battlegroups"][bg_key] = unique_keep_order(updated)
-    if changed:
-        save_data(data)
-    return changed
+    with transaction() as txn:
+        return txn.rename_player(old, new)
 
 
 def clear_bg(bg: int) -> bool:
-    data = load_data()
-    bg_key = str(bg)
-    existed = bg_key in data.get("battlegroups", {})
-    if existed:
-        data["battlegroups"][bg_key] = []
-        save_data(data)
-    return existed
+    with transaction() as txn:
+        return txn.clear_bg(bg)
 
 
 def wipe_all() -> None:
-    save_data(deepcopy(DEFAULT_DATA))
+    with transaction() as txn:
+        txn.wipe()
 
 
 def unique_keep_order(values: list[str]) -> list[str]:
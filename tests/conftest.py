@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# storage reads DATA_DIR at import time; keep test writes away from real data.
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="percentagebot-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def empty_reservations():
+    import storage
+
+    if os.path.exists(storage.RESERVATIONS_FILE):
+        os.remove(storage.RESERVATIONS_FILE)
+    yield
@@ -0,0 +1,152 @@
+import asyncio
+import io
+
+from PIL import Image
+
+import main
+import storage
+from ocr_parser import RowDebug, ScanResult
+from loadtest import FakeAttachment, FakeAuthor, FakeChannel, FakeMessage
+
+
+def png_bytes(width=800, height=450) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_find_image_falls_back_to_history_when_cache_is_partial(monkeypatch):
+    channel = FakeChannel(10, FakeAuthor(id=1, bot=True))
+    officer = FakeAuthor(id=2)
+    screenshot = png_bytes()
+    older = FakeMessage("", officer, channel, attachments=[FakeAttachment("shot.png", screenshot)])
+    recent = FakeMessage("hello", officer, channel)
+    command = FakeMessage("!scan", officer, channel)
+    channel.messages.extend([older, recent, command])
+    # The bot only saw the message after its restart.
+    monkeypatch.setattr(main, "recent_cached_messages", lambda message: [recent])
+
+    assert asyncio.run(main.find_image_for_scan(command)) == screenshot
+
+
+def test_find_image_trusts_a_full_cache(monkeypatch):
+    channel = FakeChannel(11, FakeAuthor(id=1, bot=True))
+    officer = FakeAuthor(id=2)
+    older = FakeMessage("", officer, channel, attachments=[FakeAttachment("shot.png", png_bytes())])
+    recent = [FakeMessage(f"chat {i}", officer, channel) for i in range(main.IMAGE_LOOKBACK)]
+    command = FakeMessage("!scan", officer, channel)
+    channel.messages.extend([older, *recent, command])
+    monkeypatch.setattr(main, "recent_cached_messages", lambda message: list(reversed(recent)))
+
+    assert asyncio.run(main.find_image_for_scan(command)) is None
+
+
+def test_scan_refuses_one_bg_for_several_screenshots(monkeypatch):
+    channel = FakeChannel(12, FakeAuthor(id=1, bot=True))
+    shots = [FakeAttachment(f"s{i}.png", png_bytes()) for i in range(2)]
+    message = FakeMessage("!scan bg2", FakeAuthor(id=2), channel, attachments=shots)
+
+    async def no_scan(*args, **kwargs):
+        raise AssertionError("scan_all must not run")
+
+    monkeypatch.setattr(main, "scan_all", no_scan)
+    asyncio.run(main.cmd_scan(message, "bg2"))
+    assert "stitch" in channel.messages[-1].content
+
+
+def test_combined_confirm_saves_every_bg_in_one_write():
+    channel = FakeChannel(13, FakeAuthor(id=1, bot=True))
+    writes = []
+    storage.add_change_listener(writes.append)
+    main.pending_scans["C0FFEE"] = {
+        "author_id": 2,
+        "parts": [
+            {"battlegroup": 1, "reserved_names": ["Alpha"], "result": None, "edited": False},
+            {"battlegroup": 2, "reserved_names": ["Bravo", "Charlie"], "result": None, "edited": False},
+            {"battlegroup": 3, "reserved_names": [], "result": None, "edited": False},
+        ],
+    }
+    try:
+        asyncio.run(main.cmd_confirm(FakeMessage("!confirm C0FFEE", FakeAuthor(id=2), channel), "C0FFEE"))
+    finally:
+        storage.change_listeners.remove(writes.append)
+
+    assert len(writes) == 1
+    assert storage.load_data()["battlegroups"] == {"1": ["Alpha"], "2": ["Bravo", "Charlie"]}
+    assert "C0FFEE" not in main.pending_scans
+
+
+def test_combined_confirm_refuses_a_repeated_bg():
+    channel = FakeChannel(14, FakeAuthor(id=1, bot=True))
+    main.pending_scans["BADBAD"] = {
+        "author_id": 2,
+        "parts": [
+            {"battlegroup": 2, "reserved_names": ["Alpha"], "result": None, "edited": False},
+            {"battlegroup": 2, "reserved_names": ["Bravo"], "result": None, "edited": False},
+        ],
+    }
+    asyncio.run(main.cmd_confirm(FakeMessage("!confirm BADBAD", FakeAuthor(id=2), channel), "BADBAD"))
+
+    assert "More than one image was read as BG2" in channel.messages[-1].content
+    assert storage.load_data()["battlegroups"] == {}
+    assert "BADBAD" in main.pending_scans
+    main.pending_scans.pop("BADBAD")
+
+
+def test_screenshot_count_includes_screenshots_without_new_rows():
+    rows = [RowDebug(row=1, raw_text="", cleaned_lines=[], reserved=True, name="Alpha", box=(0, 0, 1, 1), image=1)]
+    result = ScanResult(
+        battlegroup=2, reserved_names=["Alpha"], header_text="", rows=rows,
+        panel_box=(0, 0, 1, 1), image_count=2,
+    )
+    assert "Screenshots: 2 (1 unique rows)" in main.format_scan_result("ABC123", result, False)
+
+
+def test_scan_all_keeps_the_images_that_read_when_one_fails(monkeypatch):
+    channel = FakeChannel(15, FakeAuthor(id=1, bot=True))
+    shots = [FakeAttachment(f"s{i}.png", png_bytes(800 + i, 450)) for i in range(3)]
+    message = FakeMessage("!scan all", FakeAuthor(id=2), channel, attachments=shots)
+
+    async def run_scan(images, bg_override, layouts, bg_hint=None):
+        if images[0] == shots[1].data:
+            raise TimeoutError("OCR workers did not finish the scan in time")
+        bg = 1 if images[0] == shots[0].data else 3
+        return ScanResult(battlegroup=bg, reserved_names=[f"Player{bg}"], header_text="", rows=[], panel_box=(0, 0, 1, 1))
+
+    monkeypatch.setattr(main, "run_scan", run_scan)
+    asyncio.run(main.scan_all(message, shots, False))
+    scan_id = channel.last_scan_id
+    parts = main.pending_scans[scan_id]["parts"]
+
+    assert [part["battlegroup"] for part in parts] == [1, None, 3]
+    assert "Could not be read (TimeoutError" in channel.messages[-1].content
+    asyncio.run(main.cmd_confirm(FakeMessage(f"!confirm {scan_id}", FakeAuthor(id=2), channel), scan_id))
+    assert storage.load_data()["battlegroups"] == {"1": ["Player1"], "3": ["Player3"]}
+
+
+def test_scan_all_does_not_leave_the_next_download_running(monkeypatch):
+    channel = FakeChannel(16, FakeAuthor(id=1, bot=True))
+    reads = []
+
+    class SlowAttachment(FakeAttachment):
+        async def read(self):
+            reads.append(self.filename)
+            await asyncio.sleep(0.05)
+            return self.data
+
+    shots = [SlowAttachment(f"s{i}.png", png_bytes()) for i in range(2)]
+    message = FakeMessage("!scan all", FakeAuthor(id=2), channel, attachments=shots)
+
+    async def run_scan(images, bg_override, layouts, bg_hint=None):
+        raise asyncio.CancelledError()
+
+    monkeypatch.setattr(main, "run_scan", run_scan)
+
+    async def scenario():
+        try:
+            await main.scan_all(message, shots, False)
+        except asyncio.CancelledError:
+            pass
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(scenario()) == []
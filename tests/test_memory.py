@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import io
+
+import pytest
+from PIL import Image
+
+import memory
+from memory import MemoryGovernor, estimate_scan_mb
+
+
+def encoded(size, format="PNG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def test_estimate_grows_with_screenshots_but_counts_one_full_decode():
+    one = estimate_scan_mb([encoded((1600, 900))])
+    two = estimate_scan_mb([encoded((1600, 900))] * 2)
+    decode = 1600 * 900 * memory.BYTES_PER_PIXEL / memory.MB
+    assert one > memory.scan_overhead_mb(memory.OCR_CONCURRENCY) + decode
+    # The second screenshot adds its working copy but not another full decode.
+    assert two - one == pytest.approx(one - memory.scan_overhead_mb(memory.OCR_CONCURRENCY) - decode)
+
+
+def test_estimate_uses_jpeg_draft_scale():
+    png = estimate_scan_mb([encoded((6400, 3600))])
+    jpeg = estimate_scan_mb([encoded((6400, 3600), format="JPEG")])
+    assert jpeg < png
+
+
+def test_estimate_skips_unreadable_data():
+    assert estimate_scan_mb([b"not an image"]) == memory.scan_overhead_mb(memory.OCR_CONCURRENCY)
+
+
+def test_running_scans_are_not_counted_twice(monkeypatch):
+    governor = MemoryGovernor(budget_mb=400)
+    used = {"mb": 100.0}
+    monkeypatch.setattr(governor, "used_mb", lambda: used["mb"])
+
+    async def scenario():
+        assert governor.projected_mb(50) == 150
+        async with governor.admit(lambda slots: 100):
+            # The running scan has allocated its whole estimate; RSS already shows it.
+            used["mb"] = 200.0
+            assert governor.projected_mb(50) == 250
+            # Before it allocates, its reservation still holds the room.
+            used["mb"] = 110.0
+            assert governor.projected_mb(50) == 250
+
+    asyncio.run(scenario())
+
+
+def test_estimate_counts_one_tesseract_per_slot():
+    screenshot = [encoded((1170, 2532))]
+    assert estimate_scan_mb(screenshot, slots=3) - estimate_scan_mb(screenshot, slots=1) == 2 * memory.TESSERACT_MB
+
+
+def admitted(governor: MemoryGovernor, estimate) -> tuple[int, bool, float]:
+    async def scenario():
+        async with governor.admit(estimate) as (slots, low_memory):
+            return slots, low_memory, sum(governor.reserved.values())
+
+    return asyncio.run(scenario())
+
+
+def test_default_budget_leaves_a_phone_screenshot_more_than_one_slot(monkeypatch):
+    monkeypatch.setattr(memory, "OCR_CONCURRENCY", 4)
+    governor = MemoryGovernor(budget_mb=400)
+    # An idle bot and one idle worker.
+    monkeypatch.setattr(governor, "used_mb", lambda: 162.0)
+    estimate = functools.partial(estimate_scan_mb, [encoded((1170, 2532))])
+
+    slots, low_memory, reserved = admitted(governor, estimate)
+    assert 1 < slots < 4
+    assert not low_memory
+    # The scan reserves what it needs for the slots it was given, not for all four.
+    assert reserved == estimate(slots)
+
+
+def test_low_memory_mode_only_when_one_slot_does_not_fit(monkeypatch):
+    monkeypatch.setattr(memory, "OCR_CONCURRENCY", 4)
+    governor = MemoryGovernor(budget_mb=400)
+    monkeypatch.setattr(governor, "used_mb", lambda: 260.0)
+    assert admitted(governor, lambda slots: 10 + 45 * slots) == (1, False, 55)
+    monkeypatch.setattr(governor, "used_mb", lambda: 300.0)
+    assert admitted(governor, lambda slots: 10 + 45 * slots) == (1, True, 55)
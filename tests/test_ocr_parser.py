@@ -0,0 +1,341 @@
+import asyncio
+import io
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+import ocr_parser
+from ocr_parser import lines_have_other_status
+
+
+def test_other_status_needs_a_whole_status_line():
+    assert lines_have_other_status(["ASSIGNED"])
+    assert lines_have_other_status(["IN FIGHT"])
+    assert lines_have_other_status(["K.O"])
+
+
+def test_other_status_ignores_status_words_inside_names():
+    assert not lines_have_other_status(["KOBRA"])
+    assert not lines_have_other_status(["Xx_KO_xX"])
+    assert not lines_have_other_status(["Silent.Slayer ASSIGNED"])
+    assert not lines_have_other_status(["120 PTS"])
+
+
+def glyph(seed: int) -> str:
+    # A 12x20 thumbnail with a different stripe pattern per seed.
+    return bytes(255 if (x * seed + y) % 7 < 3 else 0 for y in range(20) for x in range(12)).hex()
+
+
+def test_header_digit_needs_templates_for_two_battlegroups():
+    ocr_parser.set_header_templates({"1": [glyph(1)]})
+    try:
+        assert ocr_parser.classify_header_digit(glyph(1)) == (None, 0.0)
+        ocr_parser.set_header_templates({"1": [glyph(1)], "2": [glyph(2)]})
+        battlegroup, score = ocr_parser.classify_header_digit(glyph(1))
+        assert battlegroup == 1 and score > 0.99
+        assert ocr_parser.classify_header_digit(glyph(2))[0] == 2
+    finally:
+        ocr_parser.set_header_templates({})
+
+
+def test_header_digit_rejects_an_ambiguous_match():
+    ocr_parser.set_header_templates({"1": [glyph(1)], "2": [glyph(1)]})
+    try:
+        assert ocr_parser.classify_header_digit(glyph(1))[0] is None
+    finally:
+        ocr_parser.set_header_templates({})
+
+
+def card_screenshot(cards: int, size=(1600, 900), panel=(300, 30, 1290, 880)) -> Image.Image:
+    image = Image.new("RGB", size, (12, 14, 30))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle(panel, fill=(45, 52, 80))
+    left, top, right, bottom = panel
+    first = top + (bottom - top) * 0.18
+    pitch = (bottom - first) / 4
+    for index in range(cards):
+        y = first + pitch * index
+        draw.rectangle((left + 40, y, right - 40, y + pitch * 0.88), fill=(64, 72, 104))
+    return image
+
+
+def test_detect_row_boxes_finds_each_card():
+    image = card_screenshot(4)
+    panel, method = ocr_parser.locate_panel(image)
+    rows = ocr_parser.detect_row_boxes(image, panel)
+    assert method == "edges"
+    assert len(rows) == 4
+    tops = [row["full"][1] for row in rows]
+    assert tops == sorted(tops)
+
+
+def test_detect_row_boxes_needs_two_cards():
+    image = card_screenshot(1)
+    panel, _ = ocr_parser.locate_panel(image)
+    assert ocr_parser.detect_row_boxes(image, panel) == []
+
+
+def parse_with_profile(image: Image.Image, rows: list) -> ocr_parser.ScanResult:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    profile = {"panel": [300, 30, 1290, 880], "rows": [{name: list(box) for name, box in row.items()} for row in rows]}
+    return ocr_parser.parse_battlegroup_image(
+        buffer.getvalue(), battlegroup_override=2, layouts={"1600x900": profile}, low_memory=True,
+    )
+
+
+def test_layout_profile_keeps_the_panel_but_detects_the_cards(monkeypatch):
+    monkeypatch.setattr(ocr_parser, "run_tesseract", slow_tesseract([], delay=0))
+    image = card_screenshot(4)
+    panel = (300, 30, 1290, 880)
+    # Rows saved from a screenshot scrolled 60 px further down the list.
+    saved = [{name: (box[0], box[1] + 60, box[2], box[3] + 60) for name, box in row.items()}
+             for row in ocr_parser.row_boxes(panel)]
+    result = parse_with_profile(image, saved)
+
+    assert result.panel_method == "layout"
+    assert result.row_layout == ocr_parser.detect_row_boxes(image, panel)
+    assert any("detected rows" in note for note in result.notes)
+
+
+def test_layout_profile_rows_are_the_fallback_when_no_cards_are_found(monkeypatch):
+    monkeypatch.setattr(ocr_parser, "run_tesseract", slow_tesseract([], delay=0))
+    saved = ocr_parser.row_boxes((300, 30, 1290, 880))[:3]
+    result = parse_with_profile(card_screenshot(1), saved)
+
+    assert result.row_layout == saved
+    assert any("saved rows" in note for note in result.notes)
+
+
+def test_ocr_call_key_covers_dpi_and_profile(tmp_path):
+    prepared = Image.new("L", (40, 12), 255)
+    words = tmp_path / "name.user-words"
+    words.write_text("Silent.Slayer\n", encoding="utf-8")
+    args = ["-c", "load_system_dawg=0", "--user-words", str(words)]
+    key = ocr_parser.ocr_call_key(prepared, 7, None, "name", 300, args)
+
+    assert key == ocr_parser.ocr_call_key(prepared, 7, None, "name", 300, list(args))
+    assert key != ocr_parser.ocr_call_key(prepared, 7, None, "name", 600, args)
+    assert key != ocr_parser.ocr_call_key(prepared, 7, None, "name", 300, args[:2])
+    words.write_text("Other.Player\n", encoding="utf-8")
+    assert key != ocr_parser.ocr_call_key(prepared, 7, None, "name", 300, args)
+
+
+def scrolled_panel(scroll: int) -> tuple[Image.Image, list]:
+    # A panel whose list has been scrolled by `scroll` pixels, read with the fixed rows.
+    cards = Image.new("L", (360, 1400), 40)
+    draw = ImageDraw.Draw(cards)
+    for index in range(9):
+        top = index * 151
+        draw.rectangle((0, top + 8, 359, top + 143), fill=70)
+        for bar in range(6):
+            width = 40 + (index * 37 + bar * 53) % 300
+            draw.rectangle((10, top + 16 + bar * 20, 10 + width, top + 26 + bar * 20), fill=200 - bar * 15)
+    panel = Image.new("RGB", (1000, 850), (45, 52, 80))
+    boxes = ocr_parser.row_boxes((0, 0, 1000, 850))
+    area = ocr_parser.row_area_box(boxes)
+    window = cards.crop((0, scroll, 360, scroll + area[3] - area[1]))
+    panel.paste(window.resize((area[2] - area[0], area[3] - area[1])), area[:2])
+    return panel, boxes
+
+
+def test_stitch_overlap_follows_the_scroll_not_the_row_slots():
+    first, boxes = scrolled_panel(0)
+    second, _ = scrolled_panel(250)
+    first_strip = ocr_parser.row_area_strip(first, boxes)
+    second_strip = ocr_parser.row_area_strip(second, boxes)
+    prints = lambda image: [ocr_parser.row_fingerprint(image, row["full"]) for row in boxes]
+
+    # The list moved by about one and a half rows, so no row slot lines up.
+    assert ocr_parser.find_overlap(prints(first), prints(second)) == 0
+    assert ocr_parser.scrolled_overlap(first_strip, second_strip, boxes) == 2
+
+
+def test_stitch_overlap_of_unrelated_screenshots_is_unknown():
+    first, boxes = scrolled_panel(0)
+    other = Image.new("RGB", first.size, (200, 200, 200))
+    strip = ocr_parser.row_area_strip(first, boxes)
+    assert ocr_parser.scrolled_overlap(strip, ocr_parser.row_area_strip(other, boxes), boxes) is None
+    assert ocr_parser.scrolled_overlap(strip, ocr_parser.row_area_strip(first, boxes), boxes) == 4
+
+
+def card_row(name: str, offset: int = 0) -> tuple[Image.Image, dict]:
+    image = Image.new("RGB", (1000, 850), (20, 25, 40))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=30)
+    draw.text((190, 190 + offset), name, fill=(230, 230, 230), font=font)
+    draw.text((190, 238 + offset), "RESERVED", fill=(200, 200, 90), font=font)
+    # The boxes follow the card, as card detection would place them.
+    row = {
+        key: (box[0], box[1] + offset, box[2], box[3] + offset)
+        for key, box in ocr_parser.row_boxes((0, 0, 1000, 850))[0].items()
+    }
+    return image, row
+
+
+def reusable(image: Image.Image, row: dict) -> ocr_parser.RowDebug:
+    return ocr_parser.RowDebug(
+        row=1, raw_text="", cleaned_lines=[], reserved=True, name="Silent.Slayer", box=row["full"],
+        fingerprint=ocr_parser.row_fingerprint(image, row["full"]),
+        name_print=ocr_parser.row_fingerprint(image, row["name"], ocr_parser.NAME_FINGERPRINT_SIZE),
+    )
+
+
+def lookup(candidates: list, image: Image.Image, row: dict):
+    return ocr_parser.match_reusable(
+        candidates, 1, row["full"],
+        ocr_parser.row_fingerprint(image, row["full"]),
+        ocr_parser.row_fingerprint(image, row["name"], ocr_parser.NAME_FINGERPRINT_SIZE),
+    )
+
+
+def test_reuse_tolerates_a_card_a_few_pixels_lower():
+    old = reusable(*card_row("Silent.Slayer"))
+    assert lookup([old], *card_row("Silent.Slayer", offset=4)) is old
+
+
+def test_reuse_rejects_a_different_name_on_a_similar_card():
+    old = reusable(*card_row("Silent.Slayer"))
+    assert lookup([old], *card_row("Silent.Slater")) is None
+    assert lookup([old], *card_row("Silent.Slayer", offset=40)) is None
+
+
+def slow_tesseract(calls: list, delay: float = 0.2):
+    async def run_tesseract(image, psm, whitelist=None, dpi=None, extra_args=None, timeout=ocr_parser.TESSERACT_TIMEOUT):
+        calls.append(time.monotonic())
+        await asyncio.sleep(delay)
+        return "Silent.Slayer\nRESERVED"
+    return run_tesseract
+
+
+def test_rows_queued_past_the_deadline_are_marked_incomplete(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ocr_parser, "run_tesseract", slow_tesseract(calls))
+    image = card_screenshot(4)
+    works = [
+        ocr_parser.RowWork(index=index, image=image, image_index=1, boxes=boxes)
+        for index, boxes in enumerate(ocr_parser.row_boxes((300, 30, 1290, 880)), start=1)
+    ]
+
+    started = time.monotonic()
+
+    async def scan():
+        ocr_parser._ocr_slots.set(asyncio.Semaphore(1))
+        await ocr_parser.run_row_passes(works, started + 1.0)
+
+    asyncio.run(scan())
+    # One slot and 0.2 s per read: rows still queued for it when too little time was
+    # left never start a read, and are marked incomplete instead of read as blank.
+    assert all(call - started <= 1.0 - ocr_parser.MIN_PASS_TIME + 0.05 for call in calls)
+    assert any(work.complete for work in works)
+    assert not all(work.complete for work in works)
+
+
+def test_budget_note_when_reads_run_out_of_time(monkeypatch):
+    monkeypatch.setattr(ocr_parser, "run_tesseract", slow_tesseract([], delay=0.3))
+    buffer = io.BytesIO()
+    card_screenshot(4).save(buffer, format="PNG")
+    result = ocr_parser.parse_battlegroup_image(buffer.getvalue(), battlegroup_override=2, budget=1.0, low_memory=True)
+    assert not all(row.complete for row in result.rows)
+    assert any("Scan budget" in note for note in result.notes)
+
+
+def test_rows_without_a_reuse_candidate_do_not_wait_for_the_header(monkeypatch):
+    calls = []
+    header_done = []
+    monkeypatch.setattr(ocr_parser, "run_tesseract", slow_tesseract(calls, delay=0.01))
+
+    async def read_header(image, panel, deadline=None):
+        await asyncio.sleep(0.3)
+        header_done.append(time.monotonic())
+        return "BATTLEGROUP 2"
+
+    monkeypatch.setattr(ocr_parser, "read_header", read_header)
+    buffer = io.BytesIO()
+    card_screenshot(4).save(buffer, format="PNG")
+    # An accepted scan of a different screenshot: no row can be reused.
+    old = ocr_parser.ScanResult(battlegroup=2, reserved_names=[], header_text="", rows=[
+        ocr_parser.RowDebug(row=1, raw_text="", cleaned_lines=[], reserved=False, name=None,
+                            box=(0, 0, 10, 10), fingerprint="00", name_print="00"),
+    ], panel_box=(0, 0, 1, 1))
+    result = ocr_parser.parse_battlegroup_image(buffer.getvalue(), previous={2: old})
+
+    assert result.battlegroup == 2
+    assert calls and calls[0] < header_done[0]
+
+
+def test_alias_pairs_match_each_correction_to_the_closest_typed_name():
+    pairs = ocr_parser.alias_pairs(
+        ["Silent.Slaver", "Bravo", "Xq7"],
+        ["Bravo", "Silent.Slayer", "Completely Different"],
+    )
+    assert pairs == [("Silent.Slaver", "Silent.Slayer")]
+
+
+def test_alias_pairs_ignore_case_only_changes():
+    assert ocr_parser.alias_pairs(["silent.slayer"], ["Silent.Slayer"]) == []
+
+
+def test_speculative_binary_reads_never_queue_ahead_of_gray_reads(monkeypatch):
+    modes = []
+
+    async def run_tesseract(image, psm, whitelist=None, dpi=None, extra_args=None, timeout=ocr_parser.TESSERACT_TIMEOUT):
+        modes.append(image.mode)
+        await asyncio.sleep(0.02)
+        return ""
+
+    monkeypatch.setattr(ocr_parser, "run_tesseract", run_tesseract)
+    image = card_screenshot(4)
+    works = [
+        ocr_parser.RowWork(index=index, image=image, image_index=1, boxes=boxes, speculative=True)
+        for index, boxes in enumerate(ocr_parser.row_boxes((300, 30, 1290, 880)), start=1)
+    ]
+
+    async def stage():
+        ocr_parser._ocr_slots.set(asyncio.Semaphore(2))
+        await asyncio.gather(*(ocr_parser.pass_full(work, None) for work in works))
+
+    asyncio.run(stage())
+    # Gray crops go to Tesseract as "L", binary ones as "1".
+    assert modes[:4] == ["L"] * 4
+    assert modes.count("1") == 4
+
+
+def test_replaying_a_recorded_scan_misses_nothing(monkeypatch, tmp_path):
+    async def run_tesseract(image, psm, whitelist=None, dpi=None, extra_args=None, timeout=ocr_parser.TESSERACT_TIMEOUT):
+        await asyncio.sleep(0.02)
+        return "Silent.Slayer\nRESERVED" if image.mode == "L" else ""
+
+    monkeypatch.setattr(ocr_parser, "run_tesseract", run_tesseract)
+    monkeypatch.setattr(ocr_parser, "OCR_CONCURRENCY", 4)
+    buffer = io.BytesIO()
+    card_screenshot(4).save(buffer, format="PNG")
+    fixtures = str(tmp_path / "calls.jsonl")
+    try:
+        ocr_parser.set_ocr_backend("record", fixtures)
+        recorded = ocr_parser.parse_battlegroup_image(buffer.getvalue(), battlegroup_override=2)
+        ocr_parser.set_ocr_backend("replay", fixtures)
+        replayed = ocr_parser.parse_battlegroup_image(buffer.getvalue(), battlegroup_override=2)
+        assert ocr_parser.replay_misses == 0
+    finally:
+        ocr_parser.set_ocr_backend("tesseract")
+    assert replayed.reserved_names == recorded.reserved_names == ["Silent.Slayer"]
+
+
+def test_ocr_slots_cap_concurrent_reads(monkeypatch):
+    running = []
+    peak = []
+
+    async def run_tesseract(image, psm, whitelist=None, dpi=None, extra_args=None, timeout=ocr_parser.TESSERACT_TIMEOUT):
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return "Silent.Slayer\nRESERVED"
+
+    monkeypatch.setattr(ocr_parser, "OCR_CONCURRENCY", 4)
+    monkeypatch.setattr(ocr_parser, "run_tesseract", run_tesseract)
+    buffer = io.BytesIO()
+    card_screenshot(4).save(buffer, format="PNG")
+    ocr_parser.parse_battlegroup_image(buffer.getvalue(), battlegroup_override=2, ocr_slots=2)
+    assert max(peak) == 2
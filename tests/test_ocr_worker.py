@@ -0,0 +1,59 @@
+from contextlib import closing
+
+import pytest
+
+import ocr_worker
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_worker, "QUEUE_FILE", str(tmp_path / "jobs.sqlite3"))
+    conn = ocr_worker.connect()
+    yield conn
+    conn.close()
+
+
+def test_job_of_a_dead_worker_is_requeued_then_failed(queue):
+    job_id = ocr_worker.submit_job([b"image"], {"budget": 1})
+    assert ocr_worker.claim_job(101)[0] == job_id
+
+    ocr_worker.release_jobs({101})
+    assert ocr_worker.take_result(queue, job_id) is None
+    assert ocr_worker.claim_job(102)[1] == [b"image"]
+
+    ocr_worker.release_jobs({102})
+    status, result, error = ocr_worker.take_result(queue, job_id)
+    assert status == "failed" and result is None
+    assert "stopped responding" in error
+
+
+def test_release_leaves_other_workers_jobs_alone(queue):
+    job_id = ocr_worker.submit_job([b"image"], {})
+    ocr_worker.claim_job(201)
+    ocr_worker.release_jobs({999})
+    assert ocr_worker.claim_job(202) is None
+    ocr_worker.finish_job(job_id, 201, result={"ok": True})
+    assert ocr_worker.take_result(queue, job_id) == ("done", {"ok": True}, None)
+
+
+def test_schema_is_applied_once_per_queue_file(queue, monkeypatch):
+    # Re-running this would raise a syntax error.
+    monkeypatch.setattr(ocr_worker, "SCHEMA", "not sql")
+    with closing(ocr_worker.connect()) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone() == (0,)
+
+
+def test_expired_lease_waits_for_the_supervisor(queue, monkeypatch):
+    job_id = ocr_worker.submit_job([b"image"], {})
+    ocr_worker.claim_job(101)
+    monkeypatch.setattr(ocr_worker, "JOB_LEASE_SECONDS", -1)
+
+    # Idle workers do not take the job over, so the hung worker is still found.
+    assert ocr_worker.claim_job(102) is None
+    assert ocr_worker.expired_worker_pids() == {101}
+
+    ocr_worker.release_jobs({101})
+    assert ocr_worker.claim_job(102)[0] == job_id
+    ocr_worker.finish_job(job_id, 101, result={"from": 101})
+    ocr_worker.finish_job(job_id, 102, result={"from": 102})
+    assert ocr_worker.take_result(queue, job_id) == ("done", {"from": 102}, None)
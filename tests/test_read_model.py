@@ -0,0 +1,39 @@
+import pytest
+
+import read_model
+import storage
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(read_model, "_snapshot", None)
+    monkeypatch.setattr(read_model, "_list_blocks", {})
+    monkeypatch.setattr(read_model, "_view_blocks", {})
+    monkeypatch.setattr(read_model, "_list_text", None)
+    monkeypatch.setattr(read_model, "_export_bytes", None)
+    monkeypatch.setattr(storage, "change_listeners", [])
+    read_model.install()
+    return read_model
+
+
+def test_only_the_changed_battlegroup_is_rendered_again(model):
+    storage.save_reservations(1, ["Alpha"])
+    storage.save_reservations(2, ["Bravo"])
+    assert model.viewbg_text(1) == "BG1:\n- Alpha"
+    bg2 = model.viewbg_text(2)
+    assert "BG2: 1 reserved" in model.list_text()
+
+    storage.save_reservations(1, ["Charlie"])
+
+    assert model.viewbg_text(1) == "BG1:\n- Alpha\n- Charlie"
+    assert model.viewbg_text(2) is bg2
+    assert "BG1: 2 reserved" in model.list_text()
+    assert b"Charlie" in model.export_bytes()
+
+
+def test_wipe_empties_every_view(model):
+    storage.save_reservations(3, ["Delta"])
+    assert "Delta" in model.list_text()
+    storage.wipe_all()
+    assert model.list_text() == "No reservations saved yet."
+    assert model.viewbg_text(3) == "BG3: no reserved players saved."
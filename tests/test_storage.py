@@ -0,0 +1,58 @@
+import pytest
+
+import storage
+
+
+def test_transaction_writes_once_with_every_change():
+    writes = []
+    storage.add_change_listener(writes.append)
+    try:
+        with storage.transaction() as txn:
+            txn.save_reservations(1, ["Alpha", "Bravo"])
+            txn.save_reservations(2, ["Charlie"])
+            txn.move_player("bravo", 2)
+    finally:
+        storage.change_listeners.remove(writes.append)
+
+    assert len(writes) == 1
+    assert storage.load_data()["battlegroups"] == {"1": ["Alpha"], "2": ["Charlie", "Bravo"]}
+    assert writes[0] == storage.load_data()
+
+
+def test_transaction_rolls_back_on_error():
+    storage.save_reservations(1, ["Alpha"])
+    writes = []
+    storage.add_change_listener(writes.append)
+    try:
+        with pytest.raises(RuntimeError):
+            with storage.transaction() as txn:
+                txn.save_reservations(1, ["Bravo"], replace=True)
+                raise RuntimeError("stop")
+    finally:
+        storage.change_listeners.remove(writes.append)
+
+    assert writes == []
+    assert storage.load_data()["battlegroups"] == {"1": ["Alpha"]}
+
+
+def test_transaction_without_changes_does_not_write():
+    writes = []
+    storage.add_change_listener(writes.append)
+    try:
+        with storage.transaction() as txn:
+            assert not txn.remove_player("Nobody")
+    finally:
+        storage.change_listeners.remove(writes.append)
+    assert writes == []
+
+
+def test_wipe_all_clears_through_one_transaction():
+    storage.save_reservations(1, ["Alpha"])
+    writes = []
+    storage.add_change_listener(writes.append)
+    try:
+        storage.wipe_all()
+    finally:
+        storage.change_listeners.remove(writes.append)
+    assert writes == [{"battlegroups": {}}]
+    assert storage.load_data() == {"battlegroups": {}}